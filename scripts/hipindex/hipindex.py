@@ -0,0 +1,551 @@
+import argparse
+import collections
+import concurrent.futures
+import gzip
+import io
+import json
+import os
+import re
+import struct
+import sys
+import zlib
+
+# Hip files are CPIO archives with one entry per node file (.init,
+# .def, .parm, ...). Asset libraries are INDX containers, an index of
+# named sections followed by their data, each definition being itself
+# an INDX container whose Contents.gz section is a gzipped CPIO archive.
+INDX_MAGIC = b"INDX"
+CPIO_MAGIC = b"070707"
+CPIO_HEADER_SIZE = 76
+CPIO_TRAILER = "TRAILER!!!"
+
+# Sections of an INDX library that are not asset definitions
+LIBRARY_SECTIONS = ("INDEX_SECTION", "houdini.hdalibrary")
+CONTENTS_SECTION = "Contents.gz"
+DIALOG_SECTION = "DialogScript"
+
+LIGHT_MAKER_TYPE_PREFIX = "illogic::Light_maker"
+LIGHT_MAKER_DEFINITION = re.compile(r"^illogic::\w+/Light_maker")
+ASSET_ROOT = "hdaroot"
+
+FILE_NODE_TYPES = ("file", )
+
+HIP_EXTENSIONS = (".hip", ".hipnc", ".hiplc")
+HDA_EXTENSIONS = (".hda", ".hdanc", ".hdalc", ".otl")
+
+FILENAME_PARMS = ("filename", )
+LIGHT_MODES = {
+    "0": "proc_PointLight",
+    "1": "proc_LEDLight",
+    "2": "proc_rampLight",
+    "3": "imageLight",
+    "4": "constantLight",
+    "5": "proc_CircleLight",
+}
+
+IndexEntry = collections.namedtuple(
+    "IndexEntry", ["name", "offset", "size", "modified"])
+
+PARM_LINE = re.compile(r"^(\S+)\s+\[[^\]]*\]\s+\((.*)\)\s*$")
+PARM_TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"|\[\s*(\S+)\s+\S+\s*\]|(\S+)')
+DIALOG_DEFAULT = re.compile(
+    r'parm\s*\{\s*name\s+"([^"]+)"[^{}]*?default\s+\{([^}]*)\}')
+
+
+class SectionReader(io.RawIOBase):
+    """Read only window over a section of a seekable file."""
+
+    def __init__(self, stream, offset: int, size: int):
+        self.stream = stream
+        self.offset = offset
+        self.size = size
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, position, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            position += self.position
+        elif whence == io.SEEK_END:
+            position += self.size
+        self.position = max(0, min(self.size, position))
+        return self.position
+
+    def readinto(self, buffer):
+        count = min(len(buffer), self.size - self.position)
+        if count <= 0:
+            return 0
+
+        self.stream.seek(self.offset + self.position)
+        data = self.stream.read(count)
+        buffer[:len(data)] = data
+        self.position += len(data)
+
+        return len(data)
+
+
+def skip(stream, size: int):
+    """Move a stream forward, seeking when possible.
+
+    Args:
+        stream: Stream to move
+        size (int): Number of bytes to skip
+    """
+    try:
+        stream.seek(size, io.SEEK_CUR)
+    except (OSError, io.UnsupportedOperation):
+        while size > 0:
+            chunk = stream.read(min(size, 1 << 20))
+            if not chunk:
+                break
+            size -= len(chunk)
+
+
+def readIndex(stream, offset: int=0):
+    """Read the section index of an INDX container.
+
+    Args:
+        stream: Seekable binary stream
+        offset (int, optional): Start of the container. Defaults to 0.
+
+    Raises:
+        ValueError: No INDX container at offset
+
+    Returns:
+        tuple: Absolute start of the section data and index entries
+    """
+    stream.seek(offset)
+
+    if stream.read(4) != INDX_MAGIC:
+        raise ValueError(f"No INDX container at offset {offset}")
+
+    description_size, = struct.unpack(">I", stream.read(4))
+    skip(stream, description_size)
+    _reserved, entry_count = struct.unpack(">II", stream.read(8))
+
+    entries = []
+    for _ in range(entry_count):
+        name_size, = struct.unpack(">I", stream.read(4))
+        name = stream.read(name_size).decode("utf-8", "replace")
+        section_offset, size, modified = struct.unpack(
+            ">III", stream.read(12))
+        entries.append(IndexEntry(name, section_offset, size, modified))
+
+    return stream.tell(), entries
+
+
+def iterCpio(stream, wanted):
+    """Iterate over the entries of an odc CPIO archive.
+
+    Args:
+        stream: Binary stream positioned at the archive start
+        wanted (callable): Called with each entry name, returns True when
+            the entry data is needed. It may depend on entries already
+            yielded.
+
+    Yields:
+        tuple: Entry name and data of every wanted entry
+    """
+    header = stream.read(CPIO_HEADER_SIZE)
+
+    # Asset contents start with a small binary prefix
+    if not header.startswith(CPIO_MAGIC) and header[4:10] == CPIO_MAGIC:
+        header = header[4:] + stream.read(4)
+
+    while len(header) == CPIO_HEADER_SIZE and header.startswith(CPIO_MAGIC):
+        name_size = int(header[59:65], 8)
+        data_size = int(header[65:76], 8)
+        name = stream.read(name_size).rstrip(b"\0").decode("utf-8", "replace")
+
+        if name == CPIO_TRAILER:
+            return
+
+        if wanted(name):
+            yield name, stream.read(data_size)
+        else:
+            skip(stream, data_size)
+
+        header = stream.read(CPIO_HEADER_SIZE)
+
+
+def unescape(text: str) -> str:
+    """Resolve backslash escapes of a quoted parm value.
+
+    Args:
+        text (str): Quoted value without its quotes
+
+    Returns:
+        str: Unescaped value
+    """
+    return (text.encode("latin-1", "backslashreplace")
+            .decode("unicode_escape"))
+
+
+def parseValue(text: str):
+    """Convert a bare parm value to a float when it is a number.
+
+    Args:
+        text (str): Bare value
+
+    Returns:
+        float or str: Parsed value
+    """
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def parseParms(text: str) -> dict:
+    """Parse a .parm node file.
+
+    Args:
+        text (str): File content
+
+    Returns:
+        dict: Parm name -> list of values. Numbers are floats, strings
+            are unquoted and channel references are {"channel": name}.
+    """
+    parms = {}
+
+    for line in text.splitlines():
+        match = PARM_LINE.match(line)
+        if match is None:
+            continue
+
+        values = []
+        for quoted, channel, bare in PARM_TOKEN.findall(match.group(2)):
+            if channel:
+                values.append({"channel": channel})
+            elif bare:
+                values.append(parseValue(bare))
+            else:
+                values.append(unescape(quoted))
+
+        parms[match.group(1)] = values
+
+    return parms
+
+
+def nodeType(init_text: str) -> str:
+    """Read the node type of a .init node file.
+
+    Args:
+        init_text (str): File content
+
+    Returns:
+        str: Node type name, empty if missing
+    """
+    for line in init_text.splitlines():
+        key, _, value = line.partition("=")
+        if key.strip() == "type":
+            return value.strip()
+
+    return ""
+
+
+def lightMakerRecord(path: str, type_name: str, parms: dict) -> dict:
+    """Summarize a Light_maker node.
+
+    Args:
+        path (str): Node path inside the archive
+        type_name (str): Node type name
+        parms (dict): Parsed parms
+
+    Returns:
+        dict: Node path, type, version, light mode, file references and
+            every parm
+    """
+    light_mode = parms.get("lightmode", [""])
+    light_mode = str(light_mode[0]) if light_mode else ""
+    if light_mode.endswith(".0"):
+        light_mode = light_mode[:-2]
+
+    return {
+        "path": path,
+        "type": type_name,
+        "version": type_name.rpartition("::")[2],
+        "light_mode": LIGHT_MODES.get(light_mode, light_mode),
+        "filenames": {name: parms[name][0] for name in FILENAME_PARMS
+                      if parms.get(name)},
+        "parms": parms,
+    }
+
+
+def indexCpio(stream) -> tuple:
+    """Index the Light_maker nodes and file references of a CPIO
+    network archive.
+
+    A node .init file comes before its .parm file, so only the parms of
+    Light_maker and file nodes are read.
+
+    Args:
+        stream: Binary stream positioned at the archive start
+
+    Returns:
+        tuple: Light_maker records and file node references
+    """
+    node_types = {}
+    light_makers = []
+    file_references = []
+
+    def wanted(name):
+        if name.endswith(".init"):
+            return True
+        return name.endswith(".parm") and name[:-5] in node_types
+
+    for name, data in iterCpio(stream, wanted):
+        text = data.decode("utf-8", "replace")
+        node_path = name.rpartition(".")[0]
+
+        if name.endswith(".init"):
+            type_name = nodeType(text)
+            if (type_name.startswith(LIGHT_MAKER_TYPE_PREFIX)
+                    or type_name in FILE_NODE_TYPES):
+                node_types[node_path] = type_name
+            continue
+
+        type_name = node_types[node_path]
+        parms = parseParms(text)
+
+        if type_name in FILE_NODE_TYPES:
+            file_references += [
+                {"path": node_path, "parm": parm_name,
+                 "value": parms[parm_name][0]}
+                for parm_name in FILENAME_PARMS if parms.get(parm_name)]
+        else:
+            light_makers.append(
+                lightMakerRecord(node_path, type_name, parms))
+
+    return light_makers, file_references
+
+
+def parseDialogScript(text: str) -> dict:
+    """Read the parm defaults of an asset DialogScript section.
+
+    Args:
+        text (str): Section content
+
+    Returns:
+        dict: Parm name -> list of default values
+    """
+    parms = {}
+
+    for match in DIALOG_DEFAULT.finditer(text):
+        # Defaults are always quoted, even numbers
+        parms[match.group(1)] = [
+            parseValue(bare or unescape(quoted))
+            for quoted, channel, bare in PARM_TOKEN.findall(match.group(2))]
+
+    return parms
+
+
+def indexHip(path: str) -> dict:
+    """Index the Light_maker nodes of a hip file.
+
+    Args:
+        path (str): Hip file path
+
+    Raises:
+        ValueError: The file is not a plain CPIO archive, like the
+            encoded hipnc and hiplc files
+
+    Returns:
+        dict: File path, format, Light_maker records and file node
+            references
+    """
+    with open(path, "rb") as stream:
+        # Reporting no Light_maker for an unreadable file would look
+        # like a valid audit result
+        if stream.read(len(CPIO_MAGIC)) != CPIO_MAGIC:
+            raise ValueError(f"Not a plain CPIO hip file ({path})")
+        stream.seek(0)
+
+        light_makers, file_references = indexCpio(stream)
+
+    return {
+        "file": path,
+        "format": "hip",
+        "light_makers": light_makers,
+        "file_references": file_references,
+    }
+
+
+def readSection(stream, start: int, section: IndexEntry) -> bytes:
+    """Read a whole INDX section.
+
+    Args:
+        stream: Seekable binary stream
+        start (int): Absolute start of the section data
+        section (IndexEntry): Section to read
+
+    Returns:
+        bytes: Section data
+    """
+    stream.seek(start + section.offset)
+
+    return stream.read(section.size)
+
+
+def indexHda(path: str) -> dict:
+    """Index the Light_maker definitions of an asset library.
+
+    Only the DialogScript and Contents.gz sections of Light_maker
+    definitions are read, the latter being decompressed on the fly.
+
+    Args:
+        path (str): Asset library path
+
+    Returns:
+        dict: File path, format and one record per definition
+    """
+    definitions = []
+
+    with open(path, "rb") as stream:
+        data_start, entries = readIndex(stream)
+
+        for entry in entries:
+            if entry.name in LIBRARY_SECTIONS:
+                continue
+
+            definition = {
+                "type": entry.name,
+                "version": entry.name.rpartition("::")[2],
+                "sections": [],
+            }
+            definitions.append(definition)
+
+            section_start = data_start + entry.offset
+            stream.seek(section_start)
+            if stream.read(4) != INDX_MAGIC:
+                continue
+
+            sections_start, sections = readIndex(stream, section_start)
+            definition["sections"] = [section.name for section in sections]
+
+            if not LIGHT_MAKER_DEFINITION.match(entry.name):
+                continue
+
+            for section in sections:
+                if section.name == DIALOG_SECTION:
+                    text = readSection(stream, sections_start, section)
+                    definition.update(lightMakerRecord(
+                        ASSET_ROOT, definition["type"],
+                        parseDialogScript(text.decode("utf-8", "replace"))))
+
+                elif section.name == CONTENTS_SECTION:
+                    reader = io.BufferedReader(SectionReader(
+                        stream, sections_start + section.offset,
+                        section.size))
+                    with gzip.GzipFile(fileobj=reader) as contents:
+                        light_makers, file_references = indexCpio(contents)
+                    definition["file_references"] = file_references
+
+    return {
+        "file": path,
+        "format": "hda",
+        "definitions": definitions,
+    }
+
+
+def indexFile(path: str) -> dict:
+    """Index a hip file or an asset library, reporting errors instead of
+    raising so a single broken file does not stop a show scan.
+
+    Args:
+        path (str): File path
+
+    Returns:
+        dict: Index record, with an "error" key on failure
+    """
+    try:
+        if path.lower().endswith(HDA_EXTENSIONS):
+            return indexHda(path)
+        return indexHip(path)
+    except (gzip.BadGzipFile, zlib.error, OSError, ValueError, EOFError,
+            struct.error) as error:
+        return {"file": path, "error": str(error)}
+
+
+def findFiles(root: str) -> list:
+    """List every hip file and asset library under a directory.
+
+    Args:
+        root (str): Directory to scan
+
+    Returns:
+        list: File paths
+    """
+    extensions = HIP_EXTENSIONS + HDA_EXTENSIONS
+    paths = []
+
+    for directory, _, file_names in os.walk(root):
+        for file_name in file_names:
+            if file_name.lower().endswith(extensions):
+                paths.append(os.path.join(directory, file_name))
+
+    return sorted(paths)
+
+
+def indexShow(root: str, jobs: int=None):
+    """Index every file of a show directory in parallel.
+
+    Args:
+        root (str): Show directory
+        jobs (int, optional): Number of worker processes. Defaults to
+            the number of CPUs.
+
+    Yields:
+        dict: One index record per file, in completion order
+    """
+    paths = findFiles(root)
+
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        futures = {executor.submit(indexFile, path): path for path in paths}
+        for future in concurrent.futures.as_completed(futures):
+            # A worker dying or an unexpected parsing error only loses
+            # the record of its own file
+            try:
+                record = future.result()
+            except Exception as error:
+                record = {"file": futures[future], "error": repr(error)}
+            yield record
+
+
+def main(argv: list=None):
+    """Write one JSON index record per line for every given file or
+    show directory.
+
+    Example:
+        python hipindex.py /path/to/show --jobs 8 > light_makers.jsonl
+
+    Args:
+        argv (list, optional): Command line arguments. Defaults to None.
+    """
+    parser = argparse.ArgumentParser(
+        description="Index Light_maker setups of hip files and assets.")
+    parser.add_argument("paths", nargs="+",
+                        help="Show directories or individual files")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Number of worker processes")
+    arguments = parser.parse_args(argv)
+
+    for path in arguments.paths:
+        if os.path.isdir(path):
+            records = indexShow(path, arguments.jobs)
+        else:
+            records = [indexFile(path)]
+
+        for record in records:
+            sys.stdout.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+import collections
+import time
+import numpy as np
+import lighttracking.updateuv as updateuv
+
+DEBUG = False
+
+NEAREST = "nearest"
+BILINEAR = "bilinear"
+
+# Face order and names follow the usual +X, -X, +Y, -Y, +Z, -Z layout
+FACE_NAMES = ("px", "nx", "py", "ny", "pz", "nz")
+
+# Forward, right and up axis of each face. Face pixel rows go bottom to
+# top like Houdini images.
+FACE_AXES = np.array([
+    [[1, 0, 0], [0, 0, -1], [0, 1, 0]],
+    [[-1, 0, 0], [0, 0, 1], [0, 1, 0]],
+    [[0, 1, 0], [1, 0, 0], [0, 0, -1]],
+    [[0, -1, 0], [1, 0, 0], [0, 0, 1]],
+    [[0, 0, 1], [1, 0, 0], [0, 1, 0]],
+    [[0, 0, -1], [-1, 0, 0], [0, 1, 0]]], dtype=float)
+
+# Total size of the remap tables kept in memory. A bilinear table for
+# 4K faces weighs 3 GB, tables over the budget are built on every call.
+TABLE_CACHE_BYTES = 1 << 30
+
+# Pixels remapped at once while building a table, bounding the size of
+# the intermediate arrays
+TABLE_CHUNK_PIXELS = 1 << 20
+
+# Table key -> (indices, weights), least recently used first
+TABLES = collections.OrderedDict()
+
+def faceToDirections(faces: np.ndarray, st_coordinates: np.ndarray):
+    """
+    Compute directions from cube face coordinates.
+
+    :param faces: Face indices with shape (...)
+    :param st_coordinates: Face coordinates in [0, 1] with shape (..., 2)
+    :returns array: Unit directions with shape (..., 3)
+    """
+
+    axes = FACE_AXES[faces].astype(st_coordinates.dtype, copy=False)
+    a = 2.0 * st_coordinates[..., 0:1] - 1.0
+    b = 2.0 * st_coordinates[..., 1:2] - 1.0
+
+    directions = axes[..., 0, :] + a * axes[..., 1, :] + b * axes[..., 2, :]
+
+    return directions / np.linalg.norm(directions, axis=-1, keepdims=True)
+
+def directionsToFace(directions: np.ndarray):
+    """
+    Compute cube face coordinates from directions.
+
+    :param directions: Directions with shape (..., 3), not necessarily
+        normalized
+    :returns tuple: Face indices (...) and face coordinates (..., 2)
+    """
+
+    directions = updateuv.floatArray(directions)
+
+    major_axis = np.argmax(np.abs(directions), axis=-1)
+    major_value = np.take_along_axis(
+        directions, major_axis[..., np.newaxis], axis=-1)
+    faces = 2 * major_axis + (major_value[..., 0] < 0)
+
+    axes = FACE_AXES[faces].astype(directions.dtype, copy=False)
+    depth = np.abs(major_value)
+    a = np.sum(directions * axes[..., 1, :], axis=-1, keepdims=True) / depth
+    b = np.sum(directions * axes[..., 2, :], axis=-1, keepdims=True) / depth
+
+    st_coordinates = np.concatenate([a, b], axis=-1) * 0.5 + 0.5
+
+    return faces, np.clip(st_coordinates, 0.0, 1.0)
+
+def positionToFace(light_position: np.ndarray):
+    """
+    Convert a Light_maker position into cube face coordinates.
+
+    :param light_position: A 3D vector store in a numpy array
+    :returns tuple: Face index and face coordinates, or None if wrong input
+    """
+
+    if light_position.size != 3 or light_position.ndim != 1:
+        return None
+
+    face, st_coordinates = directionsToFace(light_position)
+
+    return int(face), st_coordinates
+
+def uvToFace(uv_coordinates: np.ndarray):
+    """
+    Convert lat-long UV coordinates into cube face coordinates.
+
+    :param uv_coordinates: UV coordinates with shape (..., 2)
+    :returns tuple: Face indices (...) and face coordinates (..., 2)
+    """
+
+    return directionsToFace(updateuv.computeDirections(uv_coordinates))
+
+def faceToUV(faces: np.ndarray, st_coordinates: np.ndarray):
+    """
+    Convert cube face coordinates into lat-long UV coordinates.
+
+    :param faces: Face indices with shape (...)
+    :param st_coordinates: Face coordinates with shape (..., 2)
+    :returns array: UV coordinates with shape (..., 2)
+    """
+
+    return updateuv.computeUVs(faceToDirections(faces, st_coordinates))
+
+def pixelCenters(width: int, height: int):
+    """
+    Normalized coordinates of every pixel center.
+
+    :returns array: Coordinates with shape (height, width, 2)
+    """
+
+    x = (np.arange(width, dtype=np.float32) + 0.5) / width
+    y = (np.arange(height, dtype=np.float32) + 0.5) / height
+
+    return np.stack(np.meshgrid(x, y), axis=-1)
+
+def sampleTable(x: np.ndarray, y: np.ndarray, width: int, height: int,
+                filter: str, wrap_x: bool, offsets: np.ndarray=0):
+    """
+    Build gather indices and weights to sample an image at continuous
+    pixel positions.
+
+    :param x: Horizontal pixel positions, pixel centers at integer + 0.5
+    :param y: Vertical pixel positions
+    :param width: Width of the sampled image
+    :param height: Height of the sampled image
+    :param filter: NEAREST or BILINEAR
+    :param wrap_x: Wrap horizontally instead of clamping
+    :param offsets: Flat index offset added to every sample, used to
+        address a face inside stacked faces
+    :returns tuple: Flat indices (..., taps) and weights (..., taps)
+    """
+
+    def column(ix):
+        if wrap_x:
+            return ix % width
+        return np.clip(ix, 0, width - 1)
+
+    if filter == NEAREST:
+        ix = column(np.floor(x).astype(np.int64))
+        iy = np.clip(np.floor(y).astype(np.int64), 0, height - 1)
+        indices = (offsets + iy * width + ix)[..., np.newaxis]
+        weights = np.ones(indices.shape, dtype=np.float32)
+        return indices.astype(np.int32), weights
+
+    if filter != BILINEAR:
+        raise ValueError(f"Unknown filter ({filter})")
+
+    x = x - 0.5
+    y = y - 0.5
+    x0 = np.floor(x)
+    y0 = np.floor(y)
+    fx = (x - x0).astype(np.float32)
+    fy = (y - y0).astype(np.float32)
+
+    ix0 = column(x0.astype(np.int64))
+    ix1 = column(x0.astype(np.int64) + 1)
+    iy0 = np.clip(y0.astype(np.int64), 0, height - 1)
+    iy1 = np.clip(y0.astype(np.int64) + 1, 0, height - 1)
+
+    indices = np.stack([
+        offsets + iy0 * width + ix0,
+        offsets + iy0 * width + ix1,
+        offsets + iy1 * width + ix0,
+        offsets + iy1 * width + ix1], axis=-1)
+    weights = np.stack([
+        (1 - fx) * (1 - fy),
+        fx * (1 - fy),
+        (1 - fx) * fy,
+        fx * fy], axis=-1)
+
+    return indices.astype(np.int32), weights
+
+def tapCount(filter: str) -> int:
+    """
+    Number of pixels blended per sample.
+
+    :param filter: NEAREST or BILINEAR
+    :returns int: Tap count
+    """
+
+    if filter == NEAREST:
+        return 1
+    if filter == BILINEAR:
+        return 4
+
+    raise ValueError(f"Unknown filter ({filter})")
+
+def tableBytes(table: tuple) -> int:
+    """
+    Memory used by a remap table.
+
+    :param table: Flat indices and weights
+    :returns int: Size in bytes
+    """
+
+    indices, weights = table
+
+    return indices.nbytes + weights.nbytes
+
+def cachedTable(key: tuple, build):
+    """
+    Get a remap table from the cache, building it on first use.
+
+    The least recently used tables are released to keep the cache under
+    TABLE_CACHE_BYTES.
+
+    :param key: Table parameters
+    :param build: Callable building the table
+    :returns tuple: Flat indices and weights
+    """
+
+    table = TABLES.get(key)
+
+    if table is not None:
+        TABLES.move_to_end(key)
+        return table
+
+    table = build()
+    size = tableBytes(table)
+
+    if size > TABLE_CACHE_BYTES:
+        return table
+
+    cache_size = sum(tableBytes(cached) for cached in TABLES.values())
+    while TABLES and cache_size + size > TABLE_CACHE_BYTES:
+        _, released = TABLES.popitem(last=False)
+        cache_size -= tableBytes(released)
+
+    TABLES[key] = table
+
+    return table
+
+def equirectToCubemapTable(width: int, height: int, face_size: int,
+                           filter: str=BILINEAR):
+    """
+    Remap table sampling a lat-long image for every cube face pixel.
+
+    :returns tuple: Flat indices and weights with shape
+        (6, face_size, face_size, taps)
+    """
+
+    def build():
+        shape = (6, face_size, face_size, tapCount(filter))
+        indices = np.empty(shape, dtype=np.int32)
+        weights = np.empty(shape, dtype=np.float32)
+
+        st_coordinates = pixelCenters(face_size, face_size)
+        chunk_rows = max(1, TABLE_CHUNK_PIXELS // face_size)
+
+        for face in range(6):
+            for start in range(0, face_size, chunk_rows):
+                rows = slice(start, start + chunk_rows)
+                uv = faceToUV(face, st_coordinates[rows])
+
+                indices[face, rows], weights[face, rows] = sampleTable(
+                    uv[..., 0] * width, uv[..., 1] * height,
+                    width, height, filter, wrap_x=True)
+
+        return indices, weights
+
+    return cachedTable(
+        ("equirect_to_cubemap", width, height, face_size, filter), build)
+
+def cubemapToEquirectTable(width: int, height: int, face_size: int,
+                           filter: str=BILINEAR):
+    """
+    Remap table sampling stacked cube faces for every lat-long pixel.
+
+    Bilinear taps are clamped inside their face.
+
+    :returns tuple: Flat indices and weights with shape
+        (height, width, taps)
+    """
+
+    def build():
+        shape = (height, width, tapCount(filter))
+        indices = np.empty(shape, dtype=np.int32)
+        weights = np.empty(shape, dtype=np.float32)
+
+        uv_coordinates = pixelCenters(width, height)
+        chunk_rows = max(1, TABLE_CHUNK_PIXELS // width)
+
+        for start in range(0, height, chunk_rows):
+            rows = slice(start, start + chunk_rows)
+            faces, st_coordinates = uvToFace(uv_coordinates[rows])
+            offsets = faces * face_size * face_size
+
+            indices[rows], weights[rows] = sampleTable(
+                st_coordinates[..., 0] * face_size,
+                st_coordinates[..., 1] * face_size,
+                face_size, face_size, filter, wrap_x=False,
+                offsets=offsets)
+
+        return indices, weights
+
+    return cachedTable(
+        ("cubemap_to_equirect", width, height, face_size, filter), build)
+
+def applyTable(image: np.ndarray, indices: np.ndarray,
+               weights: np.ndarray, pixel_axes: int):
+    """
+    Gather pixels through a remap table.
+
+    :param image: Source pixels, flattened on their first pixel_axes axes
+    :param indices: Flat indices with shape (..., taps)
+    :param weights: Weights with shape (..., taps)
+    :param pixel_axes: Number of leading axes indexing pixels, the
+        remaining ones, if any, being channels
+    :returns array: Remapped image with shape (...) + channel shape
+    """
+
+    channel_shape = image.shape[pixel_axes:]
+    flat_image = image.reshape((-1, ) + channel_shape)
+
+    result = np.zeros(indices.shape[:-1] + channel_shape, dtype=np.float32)
+
+    # Broadcast weights over the channel axes
+    weight_shape = weights.shape[:-1] + (1, ) * len(channel_shape)
+
+    # One gather per tap keeps the temporary arrays image sized
+    for tap in range(indices.shape[-1]):
+        result += (flat_image[indices[..., tap]]
+                   * weights[..., tap].reshape(weight_shape))
+
+    return result
+
+def equirectToCubemap(image: np.ndarray, face_size: int,
+                      filter: str=BILINEAR):
+    """
+    Convert a lat-long image into cube faces.
+
+    :param image: Lat-long image with shape (height, width) or
+        (height, width, channels)
+    :param face_size: Resolution of each face
+    :param filter: NEAREST or BILINEAR
+    :returns array: Faces with shape (6, face_size, face_size, channels)
+        in FACE_NAMES order
+    """
+
+    if DEBUG:
+        start = time.perf_counter()
+
+    height, width = image.shape[:2]
+    indices, weights = equirectToCubemapTable(
+        width, height, face_size, filter)
+
+    faces = applyTable(image, indices, weights, pixel_axes=2)
+
+    if DEBUG:
+        print(f"Equirect to cubemap time taken :"
+              + f" {time.perf_counter() - start} s")
+
+    return faces
+
+def cubemapToEquirect(faces: np.ndarray, width: int, height: int,
+                      filter: str=BILINEAR):
+    """
+    Convert cube faces into a lat-long image.
+
+    :param faces: Faces with shape (6, face_size, face_size) or
+        (6, face_size, face_size, channels) in FACE_NAMES order
+    :param width: Width of the lat-long image
+    :param height: Height of the lat-long image
+    :param filter: NEAREST or BILINEAR
+    :returns array: Lat-long image with shape (height, width, channels)
+    """
+
+    if DEBUG:
+        start = time.perf_counter()
+
+    face_size = faces.shape[1]
+    indices, weights = cubemapToEquirectTable(
+        width, height, face_size, filter)
+
+    image = applyTable(faces, indices, weights, pixel_axes=3)
+
+    if DEBUG:
+        print(f"Cubemap to equirect time taken :"
+              + f" {time.perf_counter() - start} s")
+
+    return image
+
+def clearCache():
+    """
+    Release every cached remap table.
+    """
+
+    TABLES.clear()
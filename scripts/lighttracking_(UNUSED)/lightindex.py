@@ -0,0 +1,370 @@
+import math
+import numpy as np
+import hou
+import lighttracking.updateuv as updateuv
+
+U_NAME = updateuv.U_NAME
+V_NAME = updateuv.V_NAME
+
+SIZE_TUPLE_NAME = "size"
+SIZE_U_NAME = "sizex"
+SIZE_V_NAME = "sizey"
+SCALE_NAME = "scale2"
+
+# Angular size of a bucket of the grid
+DEFAULT_CELL_SIZE = math.radians(5.0)
+
+class LightIndex:
+    """
+    Spatial index over light directions on the unit sphere.
+
+    Lights are stored in an angular bucket grid laid out like the
+    lat-long image, each light being referenced by every bucket its
+    footprint cap overlaps. Looking up the lights covering a UV only
+    tests the lights of one bucket. Directions are also packed in a
+    contiguous array so nearest light queries are a single dot product.
+
+    Lights are identified by any hashable key, mapping nodes use their
+    session id.
+    """
+
+    def __init__(self, cell_size: float=DEFAULT_CELL_SIZE):
+        self.rows = max(1, math.ceil(math.pi / cell_size))
+        self.cols = max(1, math.ceil(2.0 * math.pi / cell_size))
+
+        self.buckets = {}
+
+        # Key -> (slot, bucket list)
+        self.lights = {}
+
+        self.keys = []
+        self.directions = np.zeros((16, 3))
+        self.cos_radii = np.zeros(16)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.lights
+
+    def bucket(self, uv_coordinates: np.ndarray):
+        """
+        Get the bucket holding a UV coordinate.
+
+        :param uv_coordinates: A 2D vector with UV coordinates
+        :returns tuple: Bucket row and column
+        """
+
+        row = min(self.rows - 1, max(0, int(uv_coordinates[1] * self.rows)))
+        col = int((uv_coordinates[0] % 1.0) * self.cols) % self.cols
+
+        return row, col
+
+    def capBuckets(self, uv_coordinates: np.ndarray, radius: float):
+        """
+        List every bucket overlapped by a spherical cap.
+
+        :param uv_coordinates: A 2D vector with the cap center UV
+        :param radius: Angular radius of the cap in radians
+        :returns list: Bucket rows and columns
+        """
+
+        v_range, u_ranges = updateuv.computeCapBounds(
+            uv_coordinates, radius)
+
+        row_start = max(0, math.floor(v_range[0] * self.rows))
+        row_end = min(self.rows, math.floor(v_range[1] * self.rows) + 1)
+
+        cols = set()
+        for u_start, u_end in u_ranges:
+            col_start = max(0, math.floor(u_start * self.cols))
+            col_end = min(self.cols, math.floor(u_end * self.cols) + 1)
+            cols.update(range(col_start, col_end))
+
+        return [(row, col) for row in range(row_start, row_end)
+                for col in cols]
+
+    def insert(self, key, uv_coordinates: np.ndarray, radius: float):
+        """
+        Add a light to the index, replacing it if it is already indexed.
+
+        :param key: Light identifier
+        :param uv_coordinates: A 2D vector with the light UV coordinates
+        :param radius: Angular radius of the light footprint in radians
+        """
+
+        if key in self.lights:
+            self.remove(key)
+
+        slot = len(self.keys)
+        if slot == len(self.directions):
+            self.directions = np.resize(self.directions, (2 * slot, 3))
+            self.cos_radii = np.resize(self.cos_radii, 2 * slot)
+
+        self.keys.append(key)
+        self.directions[slot] = updateuv.computeDirections(uv_coordinates)
+        self.cos_radii[slot] = math.cos(min(radius, math.pi))
+
+        buckets = self.capBuckets(uv_coordinates, radius)
+        for bucket in buckets:
+            self.buckets.setdefault(bucket, set()).add(key)
+
+        self.lights[key] = (slot, buckets)
+
+    def remove(self, key):
+        """
+        Remove a light from the index.
+
+        :param key: Light identifier
+        """
+
+        slot, buckets = self.lights.pop(key)
+
+        for bucket in buckets:
+            keys = self.buckets[bucket]
+            keys.discard(key)
+            if not keys:
+                del self.buckets[bucket]
+
+        # Move the last light in the freed slot to keep arrays packed
+        last = len(self.keys) - 1
+        if slot != last:
+            last_key = self.keys[last]
+            self.keys[slot] = last_key
+            self.directions[slot] = self.directions[last]
+            self.cos_radii[slot] = self.cos_radii[last]
+            self.lights[last_key] = (slot, self.lights[last_key][1])
+
+        self.keys.pop()
+
+    def lightsAt(self, uv_coordinates: np.ndarray):
+        """
+        Find the lights whose footprint covers a UV coordinate.
+
+        :param uv_coordinates: A 2D vector with UV coordinates
+        :returns list: Light keys, closest first
+        """
+
+        keys = self.buckets.get(self.bucket(uv_coordinates))
+
+        if not keys:
+            return []
+
+        direction = updateuv.computeDirections(uv_coordinates)
+        slots = np.array([self.lights[key][0] for key in keys])
+
+        cosines = self.directions[slots] @ direction
+        covering = cosines >= self.cos_radii[slots]
+
+        order = np.argsort(-cosines[covering])
+        return [self.keys[slot] for slot in slots[covering][order]]
+
+    def nearest(self, uv_coordinates: np.ndarray, count: int=1):
+        """
+        Find the lights closest to a UV coordinate.
+
+        :param uv_coordinates: A 2D vector with UV coordinates
+        :param count: Number of lights to return
+        :returns list: Light keys and angular distances in radians,
+            closest first
+        """
+
+        light_count = len(self.keys)
+        count = min(count, light_count)
+
+        if count <= 0:
+            return []
+
+        direction = updateuv.computeDirections(uv_coordinates)
+        cosines = self.directions[:light_count] @ direction
+
+        if count < light_count:
+            slots = np.argpartition(-cosines, count - 1)[:count]
+        else:
+            slots = np.arange(light_count)
+        slots = slots[np.argsort(-cosines[slots])]
+
+        angles = np.arccos(np.clip(cosines[slots], -1.0, 1.0))
+
+        return [(self.keys[slot], float(angle))
+                for slot, angle in zip(slots, angles)]
+
+
+# Copnet session id -> index
+INDEXES = {}
+
+def footprintRadius(mapping_node):
+    """
+    Angular radius of the cap bounding a mapping node light, the light
+    being a rectangle of scale2 * size on the tangent plane at unit
+    distance like in the KEY/uvmapping node.
+
+    :param mapping_node: Hdri mapping node
+    :returns float: Angular radius in radians
+    """
+
+    size_u = mapping_node.parm(SIZE_U_NAME)
+    size_v = mapping_node.parm(SIZE_V_NAME)
+    scale = mapping_node.parm(SCALE_NAME)
+
+    if size_u is None or size_v is None or scale is None:
+        return math.pi
+
+    # The rectangle corners are the furthest points from its center
+    half_diagonal = 0.5 * abs(scale.eval()) * math.hypot(
+        size_u.eval(), size_v.eval())
+
+    return math.atan(half_diagonal)
+
+def nodeUV(mapping_node):
+    """
+    Read the UV coordinates of a mapping node.
+
+    :param mapping_node: Hdri mapping node
+    :returns vector: A 2D vector with UV coordinates or None if missing
+    """
+
+    u = mapping_node.parm(U_NAME)
+    v = mapping_node.parm(V_NAME)
+
+    if u is None or v is None:
+        return None
+
+    return np.array([u.eval(), v.eval()], dtype=float)
+
+def indexNode(index: LightIndex, mapping_node):
+    """
+    Insert or refresh a mapping node in an index.
+
+    :param index: Index to update
+    :param mapping_node: Hdri mapping node
+    """
+
+    uv = nodeUV(mapping_node)
+
+    if uv is None:
+        print("Could not retrieve UV channel")
+        return
+
+    index.insert(mapping_node.sessionId(), uv, footprintRadius(mapping_node))
+
+def unindexNode(index: LightIndex, mapping_node):
+    """
+    Remove a mapping node from an index, if it is indexed.
+
+    :param index: Index to update
+    :param mapping_node: Hdri mapping node
+    """
+
+    key = mapping_node.sessionId()
+
+    if key in index:
+        index.remove(key)
+
+def getIndex(copnet, node_type_name=updateuv.LIGHT_MAKER_TYPE):
+    """
+    Get the light index of a copnet, building it on first use.
+
+    The index then follows the mapping nodes through the copnet
+    dispatcher, so only the light that moved is updated, and bound or
+    deleted mapping nodes are added or removed right away.
+
+    :param copnet: Copernicus network holding the mapping nodes
+    :param node_type_name: Name of the mapping node type
+    :returns LightIndex: The copnet index
+    """
+
+    copnet_id = copnet.sessionId()
+    index = INDEXES.get(copnet_id)
+
+    if index is not None:
+        return index
+
+    index = LightIndex()
+    for child in copnet.children():
+        if child.type().name() == node_type_name:
+            indexNode(index, child)
+
+    dispatcher = updateuv.get_dispatcher(copnet)
+    dispatcher.addListener(
+        (updateuv.POSITION_TUPLE_NAME, updateuv.UV_TUPLE_NAME,
+         SIZE_TUPLE_NAME, SCALE_NAME),
+        lambda mapping_node: indexNode(index, mapping_node))
+    # Lights created later are indexed as soon as they are bound,
+    # even if they never move
+    dispatcher.addNodeListener(
+        on_bind=lambda mapping_node: indexNode(index, mapping_node),
+        on_delete=lambda mapping_node: unindexNode(index, mapping_node))
+
+    INDEXES[copnet_id] = index
+
+    return index
+
+def keysToNodes(index: LightIndex, keys: list):
+    """
+    Resolve index keys to mapping nodes, dropping deleted ones.
+
+    :param index: Index holding the keys
+    :param keys: Mapping node session ids
+    :returns list: Mapping nodes
+    """
+
+    nodes = []
+
+    for key in keys:
+        node = hou.nodeBySessionId(key)
+        if node is None:
+            index.remove(key)
+            continue
+        nodes.append(node)
+
+    return nodes
+
+def lightsAt(copnet, uv_coordinates: np.ndarray):
+    """
+    Find the mapping nodes whose light covers a pixel of the HDRI.
+
+    :param copnet: Copernicus network holding the mapping nodes
+    :param uv_coordinates: A 2D vector with UV coordinates
+    :returns list: Mapping nodes, closest first
+    """
+
+    index = getIndex(copnet)
+
+    return keysToNodes(index, index.lightsAt(uv_coordinates))
+
+def nearestLights(copnet, uv_coordinates: np.ndarray, count: int=1):
+    """
+    Find the mapping nodes closest to a pixel of the HDRI.
+
+    :param copnet: Copernicus network holding the mapping nodes
+    :param uv_coordinates: A 2D vector with UV coordinates
+    :param count: Number of mapping nodes to return
+    :returns list: Mapping nodes, closest first
+    """
+
+    index = getIndex(copnet)
+    keys = [key for key, angle in index.nearest(uv_coordinates, count)]
+
+    return keysToNodes(index, keys)
+
+def selectLightsAt(copnet, uv_coordinates: np.ndarray):
+    """
+    Select the mapping nodes whose light covers a pixel of the HDRI,
+    falling back on the nearest one.
+
+    :param copnet: Copernicus network holding the mapping nodes
+    :param uv_coordinates: A 2D vector with UV coordinates
+    :returns list: Selected mapping nodes
+    """
+
+    nodes = lightsAt(copnet, uv_coordinates)
+
+    if not nodes:
+        nodes = nearestLights(copnet, uv_coordinates)
+
+    hou.clearAllSelected()
+    for node in nodes:
+        node.setSelected(True)
+
+    return nodes
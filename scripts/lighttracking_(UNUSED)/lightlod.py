@@ -0,0 +1,633 @@
+import math
+import time
+import numpy as np
+import hou
+import lighttracking.updateuv as updateuv
+import lighttracking.shprojection as shprojection
+
+DEBUG = False
+
+POWER_NAME = "light_power_master"
+SIZE_TUPLE_NAME = "size"
+SCALE_NAME = "scale2"
+ROTATION_NAME = "rotation_angle"
+
+# Parm tuples overridden on cluster representatives, restored on release
+SAVED_TUPLE_NAMES = (
+    updateuv.UV_TUPLE_NAME,
+    updateuv.POSITION_TUPLE_NAME,
+    POWER_NAME,
+    SIZE_TUPLE_NAME,
+    ROTATION_NAME)
+
+# Parms read from every clustered light
+READ_TUPLE_NAMES = SAVED_TUPLE_NAMES + (SCALE_NAME, )
+
+DEFAULT_MAX_ANGLE = math.radians(15.0)
+
+# Resolution of the spheres the preview error is measured on
+ERROR_SPHERE_SIZE = 32
+
+# SH band of each coefficient
+COEFFICIENT_BANDS = np.array([0, 1, 1, 1, 2, 2, 2, 2, 2])
+
+# Copnets with fewer clusterable lights are always drawn at full quality
+MIN_LIGHT_COUNT = 16
+
+# Seconds after a drag ends before the full quality lights come back
+DELAY_BEFORE_DISABLE = 1
+
+# Copnet user data key turning the preview on
+ENABLED_USER_DATA = "lightlod_preview"
+
+# Axis of the lat-long poles in updateuv directions
+POLE_AXIS = np.array([0.0, 1.0, 0.0])
+
+def clusterLights(directions: np.ndarray, powers: np.ndarray,
+                  max_angle: float=DEFAULT_MAX_ANGLE):
+    """
+    Greedily cluster lights on the sphere.
+
+    Lights are visited from the most to the least powerful, each one
+    joining the cluster of the first seed closer than max_angle or
+    seeding a new cluster, so bright lights anchor the clusters.
+
+    :param directions: Unit directions with shape (lights, 3)
+    :param powers: Light powers with shape (lights)
+    :param max_angle: Maximum angle between a light and its seed
+    :returns list: Light index arrays, one per cluster
+    """
+
+    cos_max_angle = math.cos(max_angle)
+
+    seeds = []
+    members = []
+
+    for light in np.argsort(-np.abs(powers), kind="stable"):
+        if seeds:
+            cosines = directions[seeds] @ directions[light]
+            closest = int(np.argmax(cosines))
+            if cosines[closest] >= cos_max_angle:
+                members[closest].append(light)
+                continue
+
+        seeds.append(light)
+        members.append([light])
+
+    return [np.array(cluster) for cluster in members]
+
+def planeSizes(sizes: np.ndarray, scales: np.ndarray):
+    """
+    Size of light rectangles on the tangent plane at unit distance,
+    plane_size = scale2 * size like the KEY/uvmapping node of the
+    Light_maker.
+
+    :param sizes: Size parms with shape (..., 2)
+    :param scales: Scale parms with shape (...)
+    :returns array: Plane sizes with shape (..., 2)
+    """
+
+    return np.abs(sizes * np.asarray(scales)[..., np.newaxis])
+
+def lightAreas(plane_sizes: np.ndarray):
+    """
+    Tangent plane area covered by lights.
+
+    :param plane_sizes: Plane sizes with shape (..., 2)
+    :returns array: Areas with shape (...)
+    """
+
+    return np.abs(plane_sizes[..., 0] * plane_sizes[..., 1])
+
+def solidAngles(plane_sizes: np.ndarray):
+    """
+    Solid angle covered by light rectangles at unit distance.
+
+    :param plane_sizes: Plane sizes with shape (..., 2)
+    :returns array: Solid angles in steradians with shape (...)
+    """
+
+    half_x = 0.5 * plane_sizes[..., 0]
+    half_y = 0.5 * plane_sizes[..., 1]
+
+    return 4.0 * np.arctan(
+        np.abs(half_x * half_y) / np.sqrt(1.0 + half_x ** 2 + half_y ** 2))
+
+def tangentFrame(direction: np.ndarray):
+    """
+    Tangent axes of the light plane facing a direction, x along the
+    longitude and y along the latitude.
+
+    :param direction: Unit direction
+    :returns tuple: Unit tangent x and y axes
+    """
+
+    tangent_x = np.cross(POLE_AXIS, direction)
+    norm = np.linalg.norm(tangent_x)
+
+    # Lights at a pole have no longitude, any axis will do
+    if norm < 1e-6:
+        tangent_x = np.array([1.0, 0.0, 0.0])
+    else:
+        tangent_x = tangent_x / norm
+
+    return tangent_x, np.cross(direction, tangent_x)
+
+def equivalentLight(uvs: np.ndarray, powers: np.ndarray,
+                    plane_sizes: np.ndarray, rotations: np.ndarray=None):
+    """
+    Build the single light standing for a cluster.
+
+    The UV is the power weighted centroid on the sphere. Members are
+    projected on the tangent plane of the centroid and the rectangle of
+    the equivalent light has the power weighted second moment of the
+    member rectangles around it. A light emits its power over its plane
+    area, so the power is scaled for the equivalent light to emit the
+    energy of the cluster, sum(power * area) / equivalent area.
+
+    :param uvs: Member UV coordinates with shape (members, 2)
+    :param powers: Member powers with shape (members)
+    :param plane_sizes: Member plane sizes with shape (members, 2)
+    :param rotations: Member rotations in degrees with shape (members)
+    :returns tuple: UV coordinates, power and plane size of the
+        equivalent light, unrotated
+    """
+
+    weights = np.abs(powers)
+    weight_sum = float(np.sum(weights))
+
+    if weight_sum == 0:
+        weights = np.ones(len(powers))
+        weight_sum = float(len(powers))
+    weights = weights / weight_sum
+
+    directions = updateuv.computeDirections(uvs)
+    centroid = updateuv.normalize(weights @ directions)
+
+    if not np.any(centroid):
+        centroid = directions[int(np.argmax(weights))]
+
+    uv = updateuv.computeUVs(centroid)
+
+    # Member centers on the tangent plane at unit distance
+    tangent_x, tangent_y = tangentFrame(centroid)
+    points = directions / (directions @ centroid)[:, np.newaxis]
+    offsets = np.stack([points @ tangent_x, points @ tangent_y], axis=-1)
+
+    # Second moments of the member rectangles along the tangent axes
+    if rotations is None:
+        rotations = np.zeros(len(powers))
+    angles = np.radians(rotations)
+    cosines = np.cos(angles) ** 2
+    sines = np.sin(angles) ** 2
+    squared = plane_sizes ** 2
+    moments = np.stack([
+        squared[:, 0] * cosines + squared[:, 1] * sines,
+        squared[:, 0] * sines + squared[:, 1] * cosines], axis=-1) / 12.0
+
+    plane_size = np.sqrt(12.0 * (weights @ (moments + offsets ** 2)))
+
+    area = float(lightAreas(plane_size))
+    if area > 0:
+        power = float(powers @ lightAreas(plane_sizes)) / area
+    else:
+        # Coincident points, nothing to spread
+        power = float(np.sum(powers))
+
+    return uv, power, plane_size
+
+def areaLightCoefficients(directions: np.ndarray, powers: np.ndarray,
+                          plane_sizes: np.ndarray):
+    """
+    SH coefficients of a set of area lights.
+
+    Each light is a uniform cap of the solid angle its rectangle covers,
+    emitting its power over that solid angle. The zonal harmonics of a
+    cap of angular radius a, normalized to a unit integral, scale bands
+    0 to 2 by 1, (1 + cos a) / 2 and cos a (1 + cos a) / 2.
+
+    :param directions: Unit directions with shape (lights, 3)
+    :param powers: Light powers with shape (lights)
+    :param plane_sizes: Light plane sizes with shape (lights, 2)
+    :returns array: SH coefficients with shape (9, 1)
+    """
+
+    solid_angles = solidAngles(plane_sizes)
+    cap_cosines = 1.0 - solid_angles / (2.0 * math.pi)
+
+    band_scales = np.stack([
+        np.ones_like(cap_cosines),
+        0.5 * (1.0 + cap_cosines),
+        0.5 * cap_cosines * (1.0 + cap_cosines)], axis=-1)
+    scales = band_scales[:, COEFFICIENT_BANDS]
+
+    energies = powers * solid_angles
+
+    return (energies @ (shprojection.shBasis(directions) * scales))[
+        :, np.newaxis]
+
+def previewError(directions: np.ndarray, powers: np.ndarray,
+                 plane_sizes: np.ndarray, cluster_directions: np.ndarray,
+                 cluster_powers: np.ndarray,
+                 cluster_plane_sizes: np.ndarray):
+    """
+    Measure the diffuse irradiance error of a clustered preview against
+    the full set of lights, footprints included.
+
+    :returns tuple: Relative RMS error and relative maximum error
+    """
+
+    normals, mask = shprojection.sphereNormals(ERROR_SPHERE_SIZE)
+    normals = normals[mask]
+    # Front and back hemispheres of the preview sphere
+    normals = np.concatenate([normals, normals * [1.0, 1.0, -1.0]])
+
+    full = shprojection.irradiance(
+        areaLightCoefficients(directions, powers, plane_sizes), normals)
+    clustered = shprojection.irradiance(
+        areaLightCoefficients(
+            cluster_directions, cluster_powers, cluster_plane_sizes),
+        normals)
+
+    scale = float(np.max(np.abs(full)))
+    if scale == 0:
+        return 0.0, 0.0
+
+    difference = clustered - full
+
+    return (float(np.sqrt(np.mean(difference ** 2))) / scale,
+            float(np.max(np.abs(difference))) / scale)
+
+
+class LODPreview:
+    """
+    Draw the lights of a copnet as clusters while the user drags one.
+
+    Each cluster keeps its brightest light, overridden with the
+    equivalent light of the cluster, and bypasses the others. Lights
+    whose parms are animated or driven by expressions, and the light
+    being edited, are never clustered.
+    """
+
+    def __init__(self, copnet, max_angle: float=DEFAULT_MAX_ANGLE):
+        self.copnet = copnet
+        self.max_angle = max_angle
+
+        # Node -> parm tuple name -> values
+        self.saved_parms = {}
+        # Node -> bypass state
+        self.saved_bypass = {}
+
+        self.report = {}
+
+    def canCluster(self, mapping_node) -> bool:
+        """
+        Check that every parm read or overridden on a light holds a
+        plain value.
+
+        :param mapping_node: Hdri mapping node
+        :returns bool: True if the light can be clustered
+        """
+
+        for name in READ_TUPLE_NAMES:
+            parm_tuple = mapping_node.parmTuple(name)
+            if parm_tuple is None:
+                return False
+            for parm in parm_tuple:
+                if parm.keyframes():
+                    return False
+
+        return True
+
+    def overrides(self, mapping_node) -> bool:
+        """
+        Check if the preview changed a light.
+
+        :param mapping_node: Hdri mapping node
+        :returns bool: True if the light is a representative or bypassed
+        """
+
+        return (mapping_node in self.saved_parms
+                or mapping_node in self.saved_bypass)
+
+    def begin(self, active_node=None):
+        """
+        Switch the copnet to the clustered preview.
+
+        :param active_node: Mapping node being edited, kept at full quality
+        :returns dict: Light and cluster counts and preview error
+        """
+
+        mapping_nodes = [
+            child for child in self.copnet.children()
+            if child.type().name() == updateuv.LIGHT_MAKER_TYPE
+            and child != active_node
+            and not child.isBypassed()
+            and self.canCluster(child)]
+
+        if len(mapping_nodes) < max(2, MIN_LIGHT_COUNT):
+            return {}
+
+        uvs = np.array([mapping_node.parmTuple(
+            updateuv.UV_TUPLE_NAME).eval() for mapping_node in mapping_nodes])
+        powers = np.array([mapping_node.parm(POWER_NAME).eval()
+                           for mapping_node in mapping_nodes])
+        scales = np.array([mapping_node.parm(SCALE_NAME).eval()
+                           for mapping_node in mapping_nodes])
+        rotations = np.array([mapping_node.parm(ROTATION_NAME).eval()
+                              for mapping_node in mapping_nodes])
+        plane_sizes = planeSizes(np.array(
+            [mapping_node.parmTuple(SIZE_TUPLE_NAME).eval()
+             for mapping_node in mapping_nodes]), scales)
+        directions = updateuv.computeDirections(uvs)
+
+        clusters = clusterLights(directions, powers, self.max_angle)
+
+        cluster_uvs = []
+        cluster_powers = []
+        cluster_plane_sizes = []
+
+        # Preview state is not something the user should undo
+        with hou.undos.disabler():
+            for cluster in clusters:
+                uv, power, plane_size = equivalentLight(
+                    uvs[cluster], powers[cluster], plane_sizes[cluster],
+                    rotations[cluster])
+                cluster_uvs.append(uv)
+                cluster_powers.append(power)
+                cluster_plane_sizes.append(plane_size)
+
+                if len(cluster) == 1:
+                    continue
+
+                # The first member is the brightest one
+                representative = mapping_nodes[cluster[0]]
+                scale = scales[cluster[0]]
+                if scale == 0:
+                    continue
+
+                self.saved_parms[representative] = {
+                    name: representative.parmTuple(name).eval()
+                    for name in SAVED_TUPLE_NAMES}
+
+                representative.parmTuple(updateuv.UV_TUPLE_NAME).set(uv)
+                representative.parm(POWER_NAME).set(power)
+                representative.parmTuple(SIZE_TUPLE_NAME).set(
+                    plane_size / abs(scale))
+                representative.parm(ROTATION_NAME).set(0.0)
+
+                for light in cluster[1:]:
+                    mapping_node = mapping_nodes[light]
+                    self.saved_bypass[mapping_node] = False
+                    mapping_node.bypass(True)
+
+        rms_error, max_error = previewError(
+            directions, powers, plane_sizes,
+            updateuv.computeDirections(np.array(cluster_uvs)),
+            np.array(cluster_powers), np.array(cluster_plane_sizes))
+
+        self.report = {
+            "lights": len(mapping_nodes),
+            "clusters": len(clusters),
+            "rms_error": rms_error,
+            "max_error": max_error,
+        }
+
+        if DEBUG:
+            print(f"LOD preview : {len(mapping_nodes)} lights drawn as"
+                  + f" {len(clusters)} | irradiance error"
+                  + f" {rms_error:.2%} rms, {max_error:.2%} max")
+
+        return self.report
+
+    def release(self, mapping_node):
+        """
+        Give a light back to the user before it is dragged.
+
+        :param mapping_node: Hdri mapping node about to be edited
+        """
+
+        parm_values = self.saved_parms.pop(mapping_node, {})
+        bypassed = self.saved_bypass.pop(mapping_node, None)
+
+        with hou.undos.disabler():
+            for name, values in parm_values.items():
+                mapping_node.parmTuple(name).set(values)
+
+            if bypassed is not None:
+                mapping_node.bypass(bypassed)
+
+    def end(self):
+        """
+        Restore every light to full quality.
+        """
+
+        with hou.undos.disabler():
+            for mapping_node, parm_values in self.saved_parms.items():
+                if not isValid(mapping_node):
+                    continue
+                for name, values in parm_values.items():
+                    mapping_node.parmTuple(name).set(values)
+
+            for mapping_node, bypassed in self.saved_bypass.items():
+                if isValid(mapping_node):
+                    mapping_node.bypass(bypassed)
+
+        self.saved_parms = {}
+        self.saved_bypass = {}
+
+
+def isValid(node) -> bool:
+    """
+    Check if a node has been destroyed.
+
+    :param node: Node that need to be checked
+    :returns bool: True if the node exists, False otherwise
+    """
+
+    try:
+        node.path()
+    except hou.ObjectWasDeleted:
+        return False
+
+    return True
+
+# Copnet session id -> active preview
+PREVIEWS = {}
+
+# Copnet session id -> (release time, copnet) of previews waiting for
+# their release on the event loop
+RELEASES = {}
+
+def is_lod_preview_enabled(copnet) -> bool:
+    """
+    Check if the clustered preview is turned on for a copnet.
+
+    :param copnet: Copernicus network holding the mapping nodes
+    :returns bool: True if drags switch the copnet to the preview
+    """
+
+    return copnet.userData(ENABLED_USER_DATA) == "1"
+
+def set_lod_preview_enabled(copnet, enabled: bool):
+    """
+    Turn the clustered preview on or off for a copnet, saved with the
+    hip file.
+
+    :param copnet: Copernicus network holding the mapping nodes
+    :param enabled: True to cluster the lights while one is dragged
+    """
+
+    if enabled:
+        copnet.setUserData(ENABLED_USER_DATA, "1")
+    else:
+        copnet.destroyUserData(ENABLED_USER_DATA, must_exist=False)
+        disable_lod_preview(copnet)
+
+def enable_lod_preview(copnet, active_node=None,
+                       max_angle: float=DEFAULT_MAX_ANGLE):
+    """
+    Switch a copnet to the clustered preview.
+
+    :param copnet: Copernicus network holding the mapping nodes
+    :param active_node: Mapping node being edited, kept at full quality
+    :returns dict: Preview report
+    """
+
+    RELEASES.pop(copnet.sessionId(), None)
+
+    preview = PREVIEWS.get(copnet.sessionId())
+
+    if preview is not None:
+        # The user grabbed a light drawn as part of a cluster
+        if active_node is not None and preview.overrides(active_node):
+            preview.release(active_node)
+        return preview.report
+
+    if on_hip_event not in hou.hipFile.eventCallbacks():
+        hou.hipFile.addEventCallback(on_hip_event)
+
+    preview = LODPreview(copnet, max_angle)
+    PREVIEWS[copnet.sessionId()] = preview
+
+    return preview.begin(active_node=active_node)
+
+def disable_lod_preview(copnet):
+    """
+    Restore the full set of lights of a copnet.
+
+    :param copnet: Copernicus network in preview
+    """
+
+    RELEASES.pop(copnet.sessionId(), None)
+
+    preview = PREVIEWS.pop(copnet.sessionId(), None)
+
+    if preview is not None:
+        preview.end()
+
+def disable_all_lod_previews():
+    """
+    Restore the full set of lights of every copnet in preview.
+    """
+
+    for preview in list(PREVIEWS.values()):
+        disable_lod_preview(preview.copnet)
+
+def release_expired_previews():
+    """
+    Event loop callback restoring the previews whose release time has
+    come, running on the main thread like every other parm edit.
+    """
+
+    now = time.monotonic()
+
+    for copnet_id, (release_time, copnet) in list(RELEASES.items()):
+        if now < release_time:
+            continue
+        if isValid(copnet):
+            disable_lod_preview(copnet)
+        else:
+            RELEASES.pop(copnet_id, None)
+            PREVIEWS.pop(copnet_id, None)
+
+    if not RELEASES:
+        hou.ui.removeEventLoopCallback(release_expired_previews)
+
+def schedule_release(copnet):
+    """
+    Restore the full set of lights of a copnet DELAY_BEFORE_DISABLE
+    seconds from now, unless another drag starts before.
+
+    :param copnet: Copernicus network in preview
+    """
+
+    if copnet.sessionId() not in PREVIEWS:
+        return
+
+    if not hou.isUIAvailable():
+        disable_lod_preview(copnet)
+        return
+
+    RELEASES[copnet.sessionId()] = (
+        time.monotonic() + DELAY_BEFORE_DISABLE, copnet)
+
+    if release_expired_previews not in hou.ui.eventLoopCallbacks():
+        hou.ui.addEventLoopCallback(release_expired_previews)
+
+def on_hip_event(event_type):
+    """
+    Hip file callback restoring every light before the scene is saved,
+    so clustered lights never end up in a hip file.
+
+    :param event_type: Hip file event
+    """
+
+    if event_type in (hou.hipEventType.BeforeSave,
+                      hou.hipEventType.BeforeClear,
+                      hou.hipEventType.BeforeLoad):
+        disable_all_lod_previews()
+
+def on_drag_start(kwargs):
+    """
+    Switch the copnet of a light to the clustered preview, supposed to
+    be called by the Light_maker viewer state when a handle drag
+    starts. Does nothing unless the preview is turned on for the copnet.
+
+    :param kwargs: Viewer state context holding the mapping node
+    :returns dict: Preview report
+    """
+
+    mapping_node = kwargs["node"]
+    copnet = mapping_node.parent()
+
+    if not is_lod_preview_enabled(copnet):
+        return {}
+
+    return enable_lod_preview(copnet, active_node=mapping_node)
+
+def on_drag_end(kwargs):
+    """
+    Give the copnet of a light its full quality lights back shortly
+    after a handle drag ends, supposed to be called by the Light_maker
+    viewer state.
+
+    :param kwargs: Viewer state context holding the mapping node
+    """
+
+    schedule_release(kwargs["node"].parent())
+
+def on_handle_event(kwargs):
+    """
+    Route a viewer state handle or mouse event to the drag callbacks,
+    for onHandleToState and onMouseEvent.
+
+    :param kwargs: Viewer state context with the node and ui_event
+    """
+
+    reason = kwargs["ui_event"].reason()
+
+    if reason == hou.uiEventReason.Start:
+        on_drag_start(kwargs)
+    elif reason in (hou.uiEventReason.Changed, hou.uiEventReason.Picked):
+        on_drag_end(kwargs)
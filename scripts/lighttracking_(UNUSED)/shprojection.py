@@ -0,0 +1,291 @@
+import functools
+import math
+import time
+import numpy as np
+import lighttracking.updateuv as updateuv
+
+DEBUG = False
+
+SH_COEFFICIENT_COUNT = 9
+
+# Clamped cosine convolution factor of each coefficient, bands 0 to 2
+# (Ramamoorthi and Hanrahan, "An Efficient Representation for
+# Irradiance Environment Maps")
+BAND_FACTORS = np.array([
+    math.pi,
+    2.0 * math.pi / 3.0, 2.0 * math.pi / 3.0, 2.0 * math.pi / 3.0,
+    math.pi / 4.0, math.pi / 4.0, math.pi / 4.0,
+    math.pi / 4.0, math.pi / 4.0])
+
+DEFAULT_TILE_ROWS = 32
+
+def shBasis(directions: np.ndarray):
+    """
+    Evaluate the real SH basis of bands 0 to 2.
+
+    :param directions: Unit directions with shape (..., 3)
+    :returns array: Basis values with shape (..., 9)
+    """
+
+    x = directions[..., 0]
+    y = directions[..., 1]
+    z = directions[..., 2]
+
+    return np.stack([
+        np.full_like(x, 0.282095),
+        0.488603 * y,
+        0.488603 * z,
+        0.488603 * x,
+        1.092548 * x * y,
+        1.092548 * y * z,
+        0.315392 * (3.0 * z * z - 1.0),
+        1.092548 * x * z,
+        0.546274 * (x * x - y * y)], axis=-1)
+
+def irradiance(coefficients: np.ndarray, normals: np.ndarray):
+    """
+    Evaluate diffuse irradiance from SH radiance coefficients.
+
+    :param coefficients: SH coefficients with shape (9, channels)
+    :param normals: Unit normals with shape (..., 3)
+    :returns array: Irradiance with shape (..., channels)
+    """
+
+    return (shBasis(normals) * BAND_FACTORS) @ coefficients
+
+@functools.lru_cache(maxsize=4)
+def sphereNormals(size: int):
+    """
+    Normals of a unit sphere seen from +Z with an orthographic camera.
+
+    Rows go bottom to top like Houdini images.
+
+    :param size: Resolution of the square preview
+    :returns tuple: Normals (size, size, 3) and coverage mask (size, size)
+    """
+
+    coordinates = (np.arange(size) + 0.5) / size * 2.0 - 1.0
+    x, y = np.meshgrid(coordinates, coordinates)
+    squared_radius = x * x + y * y
+
+    mask = squared_radius <= 1.0
+    z = np.sqrt(np.clip(1.0 - squared_radius, 0.0, 1.0))
+
+    return np.stack([x, y, z], axis=-1), mask
+
+def previewSphere(coefficients: np.ndarray, size: int=128):
+    """
+    Render diffuse irradiance on a preview sphere.
+
+    :param coefficients: SH coefficients with shape (9, channels)
+    :param size: Resolution of the square preview
+    :returns array: Image with shape (size, size, channels), black
+        outside the sphere
+    """
+
+    normals, mask = sphereNormals(size)
+
+    image = irradiance(coefficients, normals)
+    image[~mask] = 0.0
+
+    return image
+
+
+class SHProjector:
+    """
+    Project lat-long images of a fixed resolution onto SH bands 0 to 2.
+
+    Pixels are weighted by their exact solid angle and directions follow
+    updateuv.computeDirections, pixel (row, col) being centered on
+    u = (col + 0.5) / width and v = (row + 0.5) / height, so rows go
+    bottom to top like Houdini images.
+
+    The projection walks the image by tiles of rows to bound memory on
+    large plates.
+    """
+
+    def __init__(self, width: int, height: int,
+                 tile_rows: int=DEFAULT_TILE_ROWS):
+        self.width = width
+        self.height = height
+        self.tile_rows = tile_rows
+
+        self.u = (np.arange(width) + 0.5) / width
+        self.v = (np.arange(height) + 0.5) / height
+
+        # A row is a ring between two latitudes, its exact solid angle
+        # is split evenly between the columns
+        latitudes = math.pi * (np.arange(height + 1) / height - 0.5)
+        ring_solid_angles = np.diff(np.sin(latitudes)) * 2.0 * math.pi
+        self.solid_angles = ring_solid_angles / width
+
+    def projectRegion(self, image: np.ndarray, rows: slice=slice(None),
+                      cols: slice=slice(None)):
+        """
+        Project a rectangular region of an image.
+
+        :param image: Lat-long image with shape (height, width, channels)
+            or (height, width)
+        :param rows: Rows of the region
+        :param cols: Columns of the region
+        :returns array: SH coefficients with shape (9, channels)
+        """
+
+        return self.projectPixels(np.asarray(image)[rows, cols], rows, cols)
+
+    def projectPixels(self, pixels: np.ndarray, rows: slice, cols: slice):
+        """
+        Project pixels already cropped to a rectangular region.
+
+        :param pixels: Region pixels with shape (rows, cols, channels)
+            or (rows, cols)
+        :param rows: Rows of the region in the full image
+        :param cols: Columns of the region in the full image
+        :returns array: SH coefficients with shape (9, channels)
+        """
+
+        pixels = np.asarray(pixels, dtype=float)
+        if pixels.ndim == 2:
+            pixels = pixels[..., np.newaxis]
+
+        row_indices = np.arange(self.height)[rows]
+        u = self.u[cols]
+
+        coefficients = np.zeros((SH_COEFFICIENT_COUNT, pixels.shape[-1]))
+
+        for start in range(0, len(row_indices), self.tile_rows):
+            tile_rows = row_indices[start:start + self.tile_rows]
+
+            uv = np.stack(np.broadcast_arrays(
+                u[np.newaxis, :], self.v[tile_rows, np.newaxis]), axis=-1)
+            basis = shBasis(updateuv.computeDirections(uv))
+            basis *= self.solid_angles[tile_rows, np.newaxis, np.newaxis]
+
+            tile = pixels[start:start + self.tile_rows]
+            coefficients += np.einsum("rck,rcn->kn", basis, tile)
+
+        return coefficients
+
+    def project(self, image: np.ndarray):
+        """
+        Project a whole image.
+
+        :param image: Lat-long image with shape (height, width, channels)
+            or (height, width)
+        :returns array: SH coefficients with shape (9, channels)
+        """
+
+        return self.projectRegion(image)
+
+    def footprint(self, uv_coordinates: np.ndarray, radius: float):
+        """
+        Pixel regions covering a spherical cap.
+
+        :param uv_coordinates: UV coordinates of the cap center
+        :param radius: Angular radius of the cap in radians
+        :returns tuple: Row slice and list of column slices, two when the
+            cap wraps around u = 0
+        """
+
+        v_range, u_ranges = updateuv.computeCapBounds(
+            uv_coordinates, radius)
+
+        rows = slice(math.floor(v_range[0] * self.height),
+                     math.ceil(v_range[1] * self.height))
+        cols_list = [slice(math.floor(u_start * self.width),
+                           math.ceil(u_end * self.width))
+                     for u_start, u_end in u_ranges]
+
+        return rows, cols_list
+
+    def updateRegion(self, coefficients: np.ndarray, before: np.ndarray,
+                     after: np.ndarray, uv_coordinates: np.ndarray,
+                     radius: float):
+        """
+        Update coefficients after an edit confined to a light footprint,
+        only projecting the pixels of that footprint.
+
+        :param coefficients: SH coefficients of the image before the edit
+        :param before: Lat-long image before the edit
+        :param after: Lat-long image after the edit
+        :param uv_coordinates: UV coordinates of the light
+        :param radius: Angular radius of the light footprint in radians,
+            covering both its old and new extent
+        :returns array: SH coefficients of the image after the edit
+        """
+
+        rows, cols_list = self.footprint(uv_coordinates, radius)
+
+        coefficients = np.array(coefficients, dtype=float)
+
+        for cols in cols_list:
+            difference = (np.asarray(after[rows, cols], dtype=float)
+                          - np.asarray(before[rows, cols], dtype=float))
+
+            coefficients += self.projectPixels(difference, rows, cols)
+
+        return coefficients
+
+
+class IrradiancePreview:
+    """
+    Keep SH projections of the source and edited lat-long up to date
+    and render them as diffuse irradiance on preview spheres.
+    """
+
+    def __init__(self, source: np.ndarray, edited: np.ndarray=None,
+                 tile_rows: int=DEFAULT_TILE_ROWS):
+        height, width = source.shape[:2]
+        self.projector = SHProjector(width, height, tile_rows)
+
+        self.source_coefficients = self.projector.project(source)
+        # Own copy, the caller may edit its image in place before the
+        # next update, which would hide the change from updateRegion
+        self.edited = np.array(source if edited is None else edited,
+                               copy=True)
+        self.edited_coefficients = (
+            self.source_coefficients if edited is None
+            else self.projector.project(edited))
+
+    def setEdited(self, edited: np.ndarray):
+        """
+        Project a new edited image from scratch.
+
+        :param edited: Edited lat-long image
+        """
+
+        self.edited = np.array(edited, copy=True)
+        self.edited_coefficients = self.projector.project(edited)
+
+    def updateLight(self, edited: np.ndarray, uv_coordinates: np.ndarray,
+                    radius: float):
+        """
+        Update the edited projection after a single light changed.
+
+        :param edited: Edited lat-long image after the light change
+        :param uv_coordinates: UV coordinates of the light
+        :param radius: Angular radius of the light footprint in radians
+        """
+
+        if DEBUG:
+            start = time.process_time_ns()
+
+        self.edited_coefficients = self.projector.updateRegion(
+            self.edited_coefficients, self.edited, edited,
+            uv_coordinates, radius)
+        self.edited = np.array(edited, copy=True)
+
+        if DEBUG:
+            time_ns = time.process_time_ns() - start
+            print(f"SH update time taken : {time_ns / 1000000} ms")
+
+    def preview(self, size: int=128):
+        """
+        Render source and edited irradiance side by side.
+
+        :param size: Resolution of each preview sphere
+        :returns tuple: Source and edited preview images
+        """
+
+        return (previewSphere(self.source_coefficients, size),
+                previewSphere(self.edited_coefficients, size))
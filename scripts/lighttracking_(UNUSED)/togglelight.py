@@ -3,6 +3,7 @@ import random
 import hou
 from nodesearch import parser
 import lighttracking.updateuv as updateuv
+from transaction.transaction import Transaction
 
 X_NAME = "light_positionx"
 Y_NAME = "light_positiony"
@@ -63,91 +64,96 @@ def run(kwargs):
 
     updateuv.setup_callback(kwargs)
 
-    is_enable = True if kwargs[TOGGLE_VALUE] == 'on' else False
-
-    # Fetch light node if it exist
+    # Fetch mapping node
     mapping_node = kwargs['node']
 
     if not mapping_node:
         return
 
-    light_name = f"{HDRI_LIGHTS}_{mapping_node.name()}"
-    matcher = parser.parse_query(light_name)
-    stage = hou.node("/stage/")
-    light = matcher.nodes(stage)
+    # Run every parm and expression set as one undoable transaction
+    # so the network cooks once at the end
+    with Transaction("Toggle light", [mapping_node]) as transaction:
+        is_enable = True if kwargs[TOGGLE_VALUE] == 'on' else False
 
-    # all_lights_matcher = parser.parse_query(HDRI_LIGHTS)
-    # all_lights = matcher.nodes(stage)
+        light_name = f"{HDRI_LIGHTS}_{mapping_node.name()}"
+        matcher = parser.parse_query(light_name)
+        stage = hou.node("/stage/")
+        light = matcher.nodes(stage)
 
-    light_x = mapping_node.parm(X_NAME)
-    light_y = mapping_node.parm(Y_NAME)
-    light_z = mapping_node.parm(Z_NAME)
+        # all_lights_matcher = parser.parse_query(HDRI_LIGHTS)
+        # all_lights = matcher.nodes(stage)
 
-    
+        light_x = mapping_node.parm(X_NAME)
+        light_y = mapping_node.parm(Y_NAME)
+        light_z = mapping_node.parm(Z_NAME)
 
-    if is_enable:
 
-        # If light is not found we create a new one
-        if not light:
-            light = stage.createNode(
-                node_type_name=LIGHT_TYPE, node_name=light_name)
-        else:
-            light = light[0]
-        
-        # Give light the light position from mapping node
-        light.parm("tx").set(light_x.eval())
-        light.parm("ty").set(light_y.eval())
-        light.parm("tz").set(light_z.eval())
 
-        # Reference light transform as a reference 
-        # of light position in mapping node
-        light_x.setExpression(f'ch("{light.parm("tx").path()}")')
-        light_y.setExpression(f'ch("{light.parm("ty").path()}")')
-        light_z.setExpression(f'ch("{light.parm("tz").path()}")')
+        if is_enable:
+
+            # If light is not found we create a new one
+            if not light:
+                light = stage.createNode(
+                    node_type_name=LIGHT_TYPE, node_name=light_name)
+            else:
+                light = light[0]
 
+            transaction.watch(light)
 
-        # Set light node color randomly based on his name
-        light_node_color = getRandomColor(light_name)
-        color = hou.Color(light_node_color)
-        light.setColor(color)
+            # Give light the light position from mapping node
+            light.parm("tx").set(light_x.eval())
+            light.parm("ty").set(light_y.eval())
+            light.parm("tz").set(light_z.eval())
 
+            # Reference light transform as a reference 
+            # of light position in mapping node
+            light_x.setExpression(f'ch("{light.parm("tx").path()}")')
+            light_y.setExpression(f'ch("{light.parm("ty").path()}")')
+            light_z.setExpression(f'ch("{light.parm("tz").path()}")')
 
-        # Select light node and adjust position in network view
 
-        # TODO There is problem if we select the light without being in the panel raising
-        # a lot of errors, it's seems related to the way houdini handle his viewer state 
-        # and mess up the light handle one.
+            # Set light node color randomly based on his name
+            light_node_color = getRandomColor(light_name)
+            color = hou.Color(light_node_color)
+            light.setColor(color)
 
-        # Set light node position close the hdri copnet
-        hdri_cop_net_node = mapping_node.parent()
-        if (hdri_cop_net_node):
-            offset = hou.Vector2(0, -1)
-            parent_position = hdri_cop_net_node.position()
 
-            light.setPosition(parent_position + offset)
+            # Select light node and adjust position in network view
 
-            scene_viewer = hou.ui.paneTabOfType(hou.paneTabType.SceneViewer)
+            # TODO There is problem if we select the light without being in the panel raising
+            # a lot of errors, it's seems related to the way houdini handle his viewer state 
+            # and mess up the light handle one.
 
-            if scene_viewer:
-                scene_viewer.setPwd(stage)
-            light.setSelected(True, clear_all_selected=True) 
+            # Set light node position close the hdri copnet
+            hdri_cop_net_node = mapping_node.parent()
+            if (hdri_cop_net_node):
+                offset = hou.Vector2(0, -1)
+                parent_position = hdri_cop_net_node.position()
+
+                light.setPosition(parent_position + offset)
+
+                scene_viewer = hou.ui.paneTabOfType(hou.paneTabType.SceneViewer)
+
+                if scene_viewer:
+                    scene_viewer.setPwd(stage)
+                light.setSelected(True, clear_all_selected=True) 
+
+            else:
+                # Fallback if for some unknown reasons we cannot select the hdri copnet
+
+                light.moveToGoodPosition()
 
         else:
-            # Fallback if for some unknown reasons we cannot select the hdri copnet
 
-            light.moveToGoodPosition()
+            if not light:
+                return
 
-    else:
-        
-        if not light:
-            return
-        
-        light_x.deleteAllKeyframes()
-        light_y.deleteAllKeyframes()
-        light_z.deleteAllKeyframes()
+            light_x.deleteAllKeyframes()
+            light_y.deleteAllKeyframes()
+            light_z.deleteAllKeyframes()
 
-        light = light[0]
-        light.destroy()
+            light = light[0]
+            light.destroy()
 
 
 def selectLight(kwargs):
@@ -11,6 +11,11 @@ Z_NAME = "light_positionz"
 U_NAME = "uv_positionx"
 V_NAME = "uv_positiony"
 
+POSITION_TUPLE_NAME = "light_position"
+UV_TUPLE_NAME = "uv_position"
+
+LIGHT_MAKER_TYPE = "illogic::Light_maker_2::1.5"
+
 DEBUG = False
 
 def updateUV(hdri_mapping_node):
@@ -157,6 +162,99 @@ def computeLightPosition(uv_coordinates: np.ndarray, light_position: np.ndarray)
 
     return np.array([x, y, z])
 
+def floatArray(values):
+    """
+    Convert values to a float array, keeping single precision inputs in
+    single precision.
+
+    :param values: Array like values
+    :returns array: A float32 or float64 array
+    """
+
+    values = np.asarray(values)
+
+    if values.dtype in (np.float32, np.float64):
+        return values
+
+    return values.astype(float)
+
+def computeUVs(directions: np.ndarray):
+    """
+    Vectorized computeUV over an array of directions.
+
+    :param directions: An array of 3D vectors with shape (..., 3)
+    :returns array: UV coordinates with shape (..., 2)
+    """
+
+    directions = floatArray(directions)
+
+    norm = np.linalg.norm(directions, axis=-1)
+    norm = np.where(norm == 0, 1.0, norm)
+
+    phi = np.arctan2(directions[..., 2], directions[..., 0])
+    theta = np.arcsin(np.clip(directions[..., 1] / norm, -1.0, 1.0))
+
+    u = (phi / (2.0 * math.pi) + 0.25) % 1.0
+    v = 0.5 + theta / math.pi
+
+    return np.stack([u, v], axis=-1)
+
+def computeDirections(uv_coordinates: np.ndarray):
+    """
+    Vectorized computeLightPosition on the unit sphere.
+
+    :param uv_coordinates: An array of UV coordinates with shape (..., 2)
+    :returns array: Unit directions with shape (..., 3)
+    """
+
+    uv_coordinates = floatArray(uv_coordinates)
+
+    theta = 2.0 * math.pi * (uv_coordinates[..., 0] - 0.25)
+    phi = math.pi * (uv_coordinates[..., 1] - 0.5)
+
+    cos_phi = np.cos(phi)
+
+    return np.stack([
+        cos_phi * np.cos(theta),
+        np.sin(phi),
+        cos_phi * np.sin(theta)], axis=-1)
+
+def computeCapBounds(uv_coordinates: np.ndarray, radius: float):
+    """
+    Compute the UV bounds of a spherical cap.
+
+    :param uv_coordinates: A 2D vector with the cap center UV coordinates
+    :param radius: Angular radius of the cap in radians
+    :returns tuple: V range and list of U ranges, two when the cap wraps
+        around u = 0
+    """
+
+    latitude = math.pi * (uv_coordinates[1] - 0.5)
+    bottom = latitude - radius
+    top = latitude + radius
+
+    v_range = (max(0.0, bottom / math.pi + 0.5),
+               min(1.0, top / math.pi + 0.5))
+
+    # A cap reaching a pole covers every longitude
+    if bottom <= -0.5 * math.pi or top >= 0.5 * math.pi:
+        return v_range, [(0.0, 1.0)]
+
+    sin_ratio = math.sin(radius) / math.cos(latitude)
+    if sin_ratio >= 1.0:
+        return v_range, [(0.0, 1.0)]
+
+    half_width = math.asin(sin_ratio) / (2.0 * math.pi)
+    u_start = uv_coordinates[0] - half_width
+    u_end = uv_coordinates[0] + half_width
+
+    if u_start < 0.0:
+        return v_range, [(0.0, u_end), (u_start + 1.0, 1.0)]
+    if u_end > 1.0:
+        return v_range, [(u_start, 1.0), (0.0, u_end - 1.0)]
+
+    return v_range, [(u_start, u_end)]
+
 def normalize(vector: np.ndarray):
     """
     Normalize a vector in a numpy array.
@@ -175,86 +273,211 @@ def normalize(vector: np.ndarray):
 
     return normalized_vector
     
-def on_light_position_change(**kwargs):
+class CopnetDispatcher:
     """
-    Callback when a light position changes.
+    Single ParmTupleChanged handler shared by every mapping node of a
+    copnet.
+
+    Events are routed with a precomputed parm tuple name table, so an
+    event on a parm that is neither the light position nor the UV
+    coordinates is dropped after one dictionary lookup.
+
+    Listeners registered with addListener run after the route of their
+    parm tuple, once both channels are in sync. Node listeners are told
+    when a mapping node is bound and when it is deleted.
     """
-    
-    if kwargs is None:
-        return
-    
-    parm = kwargs['parm_tuple']
-    node = kwargs['node']
 
-    if parm is None or node is None:
-        return
+    def __init__(self, copnet, routes=None):
+        self.copnet = copnet
+        self.routes = dict(PARM_ROUTES if routes is None else routes)
+        self.listeners = {}
+        self.bind_listeners = []
+        self.delete_listeners = []
+        self.nodes = set()
+        self._in_progress = set()
 
-    if not len(parm):
-        return 
-    
-    parm = parm[0]
+    def __call__(self, **kwargs):
+        if kwargs.get("event_type") == hou.nodeEventType.BeingDeleted:
+            self.onDeleted(kwargs["node"])
+            return
 
-    if node.userData("callback_in_progress") == "1":
-        return
+        parm_tuple = kwargs.get("parm_tuple")
+
+        if parm_tuple is None:
+            return
+
+        parm_tuple_name = parm_tuple.name()
+        route = self.routes.get(parm_tuple_name)
+        listeners = self.listeners.get(parm_tuple_name)
+
+        if route is None and not listeners:
+            return
+
+        node = kwargs["node"]
+        node_id = node.sessionId()
+
+        # Setting the other channel fires this callback again
+        if node_id in self._in_progress:
+            return
 
-    if ("light_position" in parm.name()):
         try:
-            node.setUserData("callback_in_progress", "1")
-            updateUV(node)
+            self._in_progress.add(node_id)
+            if route is not None:
+                route(node)
+            for listener in listeners or ():
+                listener(node)
         finally:
-            node.setUserData("callback_in_progress", "0")
+            self._in_progress.discard(node_id)
+
+    def addListener(self, parm_tuple_names, listener):
+        """
+        Call a function with the mapping node whenever one of the given
+        parm tuples changes.
+
+        :param parm_tuple_names: Names of the parm tuples to listen to
+        :param listener: Callable taking the mapping node
+        """
+
+        for parm_tuple_name in parm_tuple_names:
+            self.listeners.setdefault(parm_tuple_name, []).append(listener)
+
+    def addNodeListener(self, on_bind=None, on_delete=None):
+        """
+        Call functions with the mapping node whenever one is bound to
+        the dispatcher or deleted.
+
+        :param on_bind: Callable taking the bound mapping node
+        :param on_delete: Callable taking the mapping node being deleted
+        """
+
+        if on_bind is not None:
+            self.bind_listeners.append(on_bind)
+        if on_delete is not None:
+            self.delete_listeners.append(on_delete)
+
+    def onDeleted(self, mapping_node):
+        """
+        Forget a mapping node being deleted.
+
+        :param mapping_node: Hdri mapping node being deleted
+        """
 
+        for listener in self.delete_listeners:
+            listener(mapping_node)
 
-def on_uv_coordinates_change(**kwargs):
+        self.nodes.discard(mapping_node.sessionId())
+
+    def bind(self, mapping_node):
+        """
+        Register the dispatcher on a mapping node, replacing any
+        dispatcher previously bound to it.
+
+        :param mapping_node: Hdri mapping node to bind
+        """
+
+        unbind(mapping_node)
+
+        mapping_node.addEventCallback(
+            (hou.nodeEventType.ParmTupleChanged,
+             hou.nodeEventType.BeingDeleted),
+            self
+        )
+        self.nodes.add(mapping_node.sessionId())
+
+        for listener in self.bind_listeners:
+            listener(mapping_node)
+
+    def unbind(self, mapping_node):
+        """
+        Remove the dispatcher from a mapping node.
+
+        :param mapping_node: Hdri mapping node to unbind
+        """
+
+        try:
+            mapping_node.removeEventCallback(
+                (hou.nodeEventType.ParmTupleChanged,
+                 hou.nodeEventType.BeingDeleted),
+                self
+            )
+        except hou.OperationFailed:
+            pass
+
+        self.nodes.discard(mapping_node.sessionId())
+
+# Parm tuple name -> update to run when that tuple changes
+PARM_ROUTES = {
+    POSITION_TUPLE_NAME: updateUV,
+    UV_TUPLE_NAME: updateLightPosition,
+}
+
+# Copnet session id -> dispatcher
+DISPATCHERS = {}
+
+def get_dispatcher(copnet):
     """
-    Callback when a uv coordinates changes.
+    Get the dispatcher of a copnet, creating it on first use.
+
+    :param copnet: Copernicus network holding the mapping nodes
+    :returns CopnetDispatcher: The copnet dispatcher
     """
-    
-    if kwargs is None:
-        return
-    
-    parm = kwargs['parm_tuple']
-    node = kwargs['node']
 
-    if parm is None or node is None:
-        return
+    copnet_id = copnet.sessionId()
+    dispatcher = DISPATCHERS.get(copnet_id)
 
-    if not len(parm):
-        return
-    
-    parm = parm[0]
+    if dispatcher is None:
+        dispatcher = CopnetDispatcher(copnet)
+        DISPATCHERS[copnet_id] = dispatcher
 
-    if node.userData("callback_in_progress") == "1":
-        return
+    return dispatcher
 
-    if ("uv_position" in parm.name()):
-        try:
-            node.setUserData("callback_in_progress", "1")
-            updateLightPosition(node)
-        finally:
-            node.setUserData("callback_in_progress", "0")
+def unbind(mapping_node):
+    """
+    Remove every copnet dispatcher registered on a mapping node.
+
+    :param mapping_node: Hdri mapping node to clean
+    """
+
+    for event_types, callback in mapping_node.eventCallbacks():
+        if isinstance(callback, CopnetDispatcher):
+            callback.unbind(mapping_node)
 
 def setup_callback(kwargs):
     """
     A method supposed to be called when a subnetwork is created 
-    or updated to add a callback on light position that update UVs.
+    or updated to bind its copnet dispatcher, which keeps light
+    position and UVs in sync.
 
     :param kwargs: Node context
     """
 
     mapping_node = kwargs["node"]
 
-    mapping_node.removeAllEventCallbacks()
+    get_dispatcher(mapping_node.parent()).bind(mapping_node)
 
-    mapping_node.setUserData("callback_in_progress", "0")
-    
-    mapping_node.addEventCallback(
-        (hou.nodeEventType.ParmTupleChanged, ),
-        on_light_position_change
-    )
-    
-    mapping_node.addEventCallback(
-        (hou.nodeEventType.ParmTupleChanged, ),
-        on_uv_coordinates_change
-    )
-    
\ No newline at end of file
+def rebind_all_callbacks(node_type_name=LIGHT_MAKER_TYPE):
+    """
+    Bind every Light_maker of the scene to its copnet dispatcher,
+    typically after a hip load.
+
+    :param node_type_name: Name of the mapping node type
+    :returns int: Number of bound mapping nodes
+    """
+
+    node_type = hou.nodeType(hou.copNodeTypeCategory(), node_type_name)
+
+    if node_type is None:
+        print(f"Could not find node type ({node_type_name})")
+        return 0
+
+    # Forget dispatchers of copnets that no longer exist
+    for copnet_id in list(DISPATCHERS):
+        if hou.nodeBySessionId(copnet_id) is None:
+            del DISPATCHERS[copnet_id]
+
+    count = 0
+    for mapping_node in node_type.instances():
+        get_dispatcher(mapping_node.parent()).bind(mapping_node)
+        count += 1
+
+    return count
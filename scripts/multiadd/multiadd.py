@@ -1,4 +1,5 @@
 import hou
+from transaction.transaction import Transaction
 
 BLENDTYPE = "blend"
 ADDMODE = 3
@@ -9,6 +10,9 @@ def onInputChanged(kwargs):
     """Callback on a multi blend subnetwork which 
     will adjust the number of blend connections.
 
+    The rewiring runs as a single transaction: one undo entry, no cook
+    until it is done, and rolled back if it fails halfway.
+
     Args:
         kwargs (dict): Subnetwork context
 
@@ -25,6 +29,29 @@ def onInputChanged(kwargs):
     subnet: hou.Node = kwargs["node"]
     input_to_connect = kwargs["input_index"]
 
+    # Validate the subnet before any edit, so a failing rewire always
+    # has something to roll back
+    inputs_node, outputs_node = findSubnetIO(subnet)
+
+    # Rolled back once Houdini is done with the input change callback,
+    # along with the connection that triggered it
+    with Transaction("Multi add rewire", [subnet], defer_rollback=True):
+        rewire(subnet, input_to_connect, inputs_node, outputs_node)
+
+
+def findSubnetIO(subnet: hou.Node) -> tuple:
+    """Find the input and output nodes of the subnet.
+
+    Args:
+        subnet (hou.Node): Multi blend subnetwork
+
+    Raises:
+        KeyError: Cannot find input or ouput not in the subnet
+
+    Returns:
+        tuple: Input node and output node
+    """
+
     # Parse subnet inputs and outputs and leave if we cant
     inputs_node = None
     outputs_node = None
@@ -39,7 +66,21 @@ def onInputChanged(kwargs):
 
     if (inputs_node is None or outputs_node is None):
         raise KeyError("Could not find input or output node")
-    
+
+    return inputs_node, outputs_node
+
+
+def rewire(subnet: hou.Node, input_to_connect: int,
+           inputs_node: hou.Node, outputs_node: hou.Node):
+    """Adjust blend connections after an input of the subnet changed.
+
+    Args:
+        subnet (hou.Node): Multi blend subnetwork
+        input_to_connect (int): Index of the subnet input that changed
+        inputs_node (hou.Node): Subnet input node
+        outputs_node (hou.Node): Subnet output node
+    """
+
     # Clear already existing connection
     for connection in inputs_node.outputConnections():
         if connection.outputIndex() == input_to_connect:
@@ -0,0 +1,254 @@
+import concurrent.futures
+import json
+import os
+import subprocess
+import sys
+import time
+import hou
+
+HYTHON = "hython"
+
+# Each worker holds a whole Houdini session and its own copy of the
+# plates, so the pool stays small whatever the number of CPUs
+DEFAULT_WORKER_COUNT = 4
+MAX_WORKER_COUNT = 8
+
+# Prefix of the worker lines carrying a frame timing
+TIMING_PREFIX = "FRAME_TIMING "
+
+# Background render started from the UI, one at a time
+CURRENT_RENDER = None
+
+def splitFrames(frames: list, worker_count: int) -> list:
+    """Split frames into one contiguous chunk per worker.
+
+    A single chunk per worker means each worker loads the hip file and
+    the source plate only once.
+
+    Args:
+        frames (list): Frames to render, in order
+        worker_count (int): Number of workers
+
+    Returns:
+        list: Frame lists, at most worker_count of them
+    """
+    worker_count = max(1, min(worker_count, len(frames)))
+    chunk_size, remainder = divmod(len(frames), worker_count)
+
+    chunks = []
+    start = 0
+    for worker in range(worker_count):
+        end = start + chunk_size + (1 if worker < remainder else 0)
+        chunks.append(frames[start:end])
+        start = end
+
+    return chunks
+
+
+def runWorker(hip_path: str, rop_path: str, frames: list,
+              hython: str=HYTHON) -> dict:
+    """Render a chunk of frames in a separate hython process.
+
+    Args:
+        hip_path (str): Hip file to load
+        rop_path (str): Path of the ROP writing the frames
+        frames (list): Frames of the chunk
+        hython (str, optional): Hython executable. Defaults to HYTHON.
+
+    Raises:
+        RuntimeError: The worker failed or did not report every frame
+
+    Returns:
+        dict: Frame -> render time in seconds
+    """
+    command = [hython, os.path.abspath(__file__), hip_path, rop_path]
+    command += [str(frame) for frame in frames]
+
+    process = subprocess.run(command, capture_output=True, text=True)
+
+    if process.returncode != 0:
+        raise RuntimeError(
+            f"Worker for frames {frames[0]}-{frames[-1]} failed :\n"
+            + process.stderr)
+
+    timings = {}
+    for line in process.stdout.splitlines():
+        if line.startswith(TIMING_PREFIX):
+            timing = json.loads(line[len(TIMING_PREFIX):])
+            timings[timing["frame"]] = timing["seconds"]
+
+    # A frame without timing line was not rendered, or not completely
+    missing = [frame for frame in frames if frame not in timings]
+    if missing:
+        raise RuntimeError(
+            f"Worker for frames {frames[0]}-{frames[-1]} did not report"
+            + f" frames {missing} :\n" + process.stderr)
+
+    return timings
+
+
+def renderSequence(hip_path: str, rop_path: str, start: float, end: float,
+                   step: float=1, worker_count: int=None,
+                   hython: str=HYTHON) -> dict:
+    """Render a frame range with a pool of local hython workers.
+
+    Args:
+        hip_path (str): Hip file to render
+        rop_path (str): Path of the ROP writing the frames
+        start (float): First frame
+        end (float): Last frame, included
+        step (float, optional): Frame increment. Defaults to 1.
+        worker_count (int, optional): Number of workers, capped to
+            MAX_WORKER_COUNT and the number of CPUs. Defaults to
+            DEFAULT_WORKER_COUNT.
+        hython (str, optional): Hython executable. Defaults to HYTHON.
+
+    Raises:
+        ValueError: The step is zero or the frame range is empty
+
+    Returns:
+        dict: Per frame timings, elapsed time and frames per second
+    """
+    if step == 0:
+        raise ValueError(f"Frame step cannot be zero ({start}, {end})")
+
+    frame_count = int(round((end - start) / step)) + 1
+    frames = [start + index * step for index in range(frame_count)]
+
+    if not frames:
+        raise ValueError(f"Empty frame range ({start}, {end}, {step})")
+
+    if worker_count is None:
+        worker_count = DEFAULT_WORKER_COUNT
+    worker_count = min(worker_count, MAX_WORKER_COUNT, os.cpu_count() or 1)
+    chunks = splitFrames(frames, worker_count)
+
+    start_time = time.perf_counter()
+
+    # Threads only wait on the worker processes
+    timings = {}
+    with concurrent.futures.ThreadPoolExecutor(len(chunks)) as executor:
+        futures = [executor.submit(runWorker, hip_path, rop_path, chunk,
+                                   hython) for chunk in chunks]
+        for future in concurrent.futures.as_completed(futures):
+            timings.update(future.result())
+
+    elapsed = time.perf_counter() - start_time
+
+    return {
+        "timings": dict(sorted(timings.items())),
+        "elapsed": elapsed,
+        "workers": len(chunks),
+        "fps": len(timings) / elapsed if elapsed else 0.0,
+    }
+
+
+def printReport(report: dict):
+    """Print the per frame timings and the throughput of a render.
+
+    Args:
+        report (dict): Render report from renderSequence
+    """
+    for frame, seconds in report["timings"].items():
+        print(f"Frame {frame} : {seconds:.3f} s")
+    print(f"{len(report['timings'])} frames on {report['workers']} workers"
+          + f" in {report['elapsed']:.2f} s | {report['fps']:.2f} fps")
+
+
+def onRenderDone(future: concurrent.futures.Future):
+    """Print the report of a background render, or why it failed.
+
+    Args:
+        future (concurrent.futures.Future): Finished render
+    """
+    error = future.exception()
+
+    if error is not None:
+        print(f"Sequence render failed : {error}")
+        return
+
+    printReport(future.result())
+
+
+def renderCurrentSequence(kwargs, worker_count: int=None):
+    """Render the frame range of a ROP of the current hip file in
+    parallel, supposed to be called from a ROP button.
+
+    The workers run in the background so the UI stays responsive, the
+    report is printed once every frame is done.
+
+    Args:
+        kwargs (dict): ROP context
+        worker_count (int, optional): Number of workers. Defaults to
+            DEFAULT_WORKER_COUNT.
+
+    Returns:
+        concurrent.futures.Future: Render report, None if the hip file
+            has unsaved changes
+    """
+    global CURRENT_RENDER
+
+    rop = kwargs["node"]
+
+    if CURRENT_RENDER is not None and not CURRENT_RENDER.done():
+        print("A sequence is already rendering")
+        return CURRENT_RENDER
+
+    if hou.hipFile.hasUnsavedChanges():
+        print("Save the hip file before rendering a sequence,"
+              + " workers load it from disk")
+        return None
+
+    # Read everything from hou here, the background thread only waits
+    # on the worker processes
+    start, end, step = rop.parmTuple("f").eval()
+
+    executor = concurrent.futures.ThreadPoolExecutor(1)
+    future = executor.submit(renderSequence, hou.hipFile.path(), rop.path(),
+                             start, end, step, worker_count)
+    executor.shutdown(wait=False)
+
+    def onDone(future):
+        # Print from the main thread
+        if hou.isUIAvailable():
+            import hdefereval
+            hdefereval.executeDeferred(lambda: onRenderDone(future))
+        else:
+            onRenderDone(future)
+
+    future.add_done_callback(onDone)
+    CURRENT_RENDER = future
+
+    print(f"Rendering frames {start}-{end} of {rop.path()} in background")
+
+    return future
+
+
+def workerMain(argv: list):
+    """Worker entry point: load the hip file once and render every
+    frame of the chunk, printing one timing line per frame.
+
+    Args:
+        argv (list): Hip path, ROP path and frames
+    """
+    hip_path, rop_path = argv[0], argv[1]
+    frames = [float(frame) for frame in argv[2:]]
+
+    hou.hipFile.load(hip_path, suppress_save_prompt=True,
+                     ignore_load_warnings=True)
+
+    rop = hou.node(rop_path)
+    if rop is None:
+        raise KeyError(f"Could not find ROP ({rop_path})")
+
+    for frame in frames:
+        start = time.perf_counter()
+        rop.render(frame_range=(frame, frame))
+        seconds = time.perf_counter() - start
+
+        print(TIMING_PREFIX + json.dumps(
+            {"frame": frame, "seconds": seconds}), flush=True)
+
+
+if __name__ == "__main__":
+    workerMain(sys.argv[1:])
@@ -0,0 +1,240 @@
+import time
+import hou
+
+DEBUG = False
+
+# Operation label -> cook counts of every transaction run with that label
+COOK_HISTORY = {}
+
+class Transaction:
+    """Context manager running network edits as a single transaction.
+
+    While open, every edit lands in one undo group and Houdini is kept in
+    manual update mode, so no node cooks and the viewport is not redrawn
+    until the transaction commits. If an exception interrupts the edits
+    once some were recorded, the undo group is undone so no half-rewired
+    network is left behind.
+
+    The cooks Houdini then runs under the watched nodes are recorded in
+    COOK_HISTORY once the event loop is idle again, so the count covers
+    the deferred cook without forcing one. With DEBUG on, the watched
+    nodes are also cooked right away to measure the commit cost.
+
+    Example:
+        with Transaction("Multi add rewire", [subnet]):
+            blend.setInput(0, inputs_node, 1)
+    """
+
+    def __init__(self, label: str, watched_nodes: list=None,
+                 rollback: bool=True, defer_rollback: bool=False):
+        """
+        Args:
+            label (str): Undo label, also used as the history key
+            watched_nodes (list, optional): Nodes whose cooks are
+                counted, children included. Defaults to None.
+            rollback (bool, optional): Undo the edits on exception.
+                Defaults to True.
+            defer_rollback (bool, optional): Undo once the current
+                callback has returned, for transactions run inside node
+                event callbacks. Defaults to False.
+        """
+        self.label = label
+        self.watched_nodes = []
+        self.rollback = rollback
+        self.defer_rollback = defer_rollback
+
+        self.cook_count = 0
+        self.elapsed = 0.0
+        self.committed = False
+
+        self._undo_group = None
+        self._undo_labels = ()
+        self._update_mode = None
+        self._cook_counts = {}
+        self._start = 0.0
+
+        for node in watched_nodes or []:
+            self.watch(node)
+
+    def watch(self, node: hou.Node):
+        """Count the cooks of a node and its children, typically a node
+        created during the transaction.
+
+        Args:
+            node (hou.Node): Node to watch
+        """
+        self._cook_counts.update(snapshotCookCounts([node]))
+        self.watched_nodes.append(node)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+        self._update_mode = hou.updateModeSetting()
+        hou.setUpdateMode(hou.updateMode.Manual)
+
+        self._undo_labels = hou.undos.undoLabels()
+        self._undo_group = hou.undos.group(self.label)
+        self._undo_group.__enter__()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.committed = exc_type is None
+
+        try:
+            self._undo_group.__exit__(exc_type, exc_value, traceback)
+
+            if exc_type is not None and self.rollback:
+                self.rollBack()
+        finally:
+            hou.setUpdateMode(self._update_mode)
+
+            if DEBUG:
+                cookNodes(self.watched_nodes)
+            self.elapsed = time.perf_counter() - self._start
+
+            # Houdini cooks the dirty nodes once control returns to the
+            # event loop, count the cooks after it
+            if hou.isUIAvailable() and not DEBUG:
+                import hdefereval
+                hdefereval.executeDeferred(self.recordCooks)
+            else:
+                self.recordCooks()
+
+        # Let the exception propagate
+        return False
+
+    def recordCooks(self):
+        """Count the cooks under the watched nodes since the
+        transaction started and record them in COOK_HISTORY."""
+        self.cook_count = countCooks(self.watched_nodes, self._cook_counts)
+        COOK_HISTORY.setdefault(self.label, []).append(self.cook_count)
+
+        if DEBUG:
+            status = "committed" if self.committed else "rolled back"
+            print(f"{self.label} {status} : {self.cook_count} cooks"
+                  + f" | {self.elapsed} s")
+
+    def rollBack(self):
+        """Undo the transaction group, if it recorded any edit."""
+        if not hou.undos.areEnabled():
+            print(f"Undos are disabled, cannot roll back ({self.label})")
+            return
+
+        if self.defer_rollback:
+            self.deferRollBack()
+            return
+
+        # An empty group adds no undo entry, undoing would revert the
+        # previous unrelated operation
+        if hou.undos.undoLabels() == self._undo_labels:
+            return
+
+        hou.undos.performUndo()
+
+    def deferRollBack(self):
+        """Undo the transaction once the callback running it returned.
+
+        Inside a node callback the group belongs to the undo block of
+        the operation that fired the callback, which only shows in the
+        undo labels once that block is closed, so the labels are only
+        compared then.
+        """
+        undo_labels = self._undo_labels
+
+        def deferredUndo():
+            current_labels = hou.undos.undoLabels()
+
+            # Nothing recorded, the operation failed before any edit
+            if current_labels == undo_labels:
+                return
+
+            # More than the interrupted operation was recorded since,
+            # undoing now would revert something else
+            if len(current_labels) > len(undo_labels) + 1:
+                print(f"Other operations were recorded, cannot roll back"
+                      + f" ({self.label})")
+                return
+
+            hou.undos.performUndo()
+
+        if hou.isUIAvailable():
+            import hdefereval
+            hdefereval.executeDeferred(deferredUndo)
+        else:
+            print(f"Cannot defer roll back without UI ({self.label})")
+
+
+def cookNodes(nodes: list):
+    """Cook nodes that still exist, skipping the ones that fail.
+
+    Args:
+        nodes (list): Nodes to cook
+    """
+    for node in nodes:
+        try:
+            node.cook()
+        except (hou.ObjectWasDeleted, hou.OperationFailed):
+            continue
+
+
+def snapshotCookCounts(watched_nodes: list) -> dict:
+    """Record the cook count of every node under the watched networks.
+
+    Args:
+        watched_nodes (list): Networks to inspect
+
+    Returns:
+        dict: Node session id -> cook count
+    """
+    cook_counts = {}
+
+    for root in watched_nodes:
+        for node in (root, ) + root.allSubChildren():
+            cook_counts[node.sessionId()] = node.cookCount()
+
+    return cook_counts
+
+
+def countCooks(watched_nodes: list, cook_counts: dict) -> int:
+    """Count cooks since a snapshot under the watched networks.
+
+    Nodes created after the snapshot count all their cooks, nodes
+    destroyed since are ignored.
+
+    Args:
+        watched_nodes (list): Networks to inspect
+        cook_counts (dict): Snapshot from snapshotCookCounts
+
+    Returns:
+        int: Number of cooks
+    """
+    total = 0
+
+    for root in watched_nodes:
+        try:
+            nodes = (root, ) + root.allSubChildren()
+        except hou.ObjectWasDeleted:
+            continue
+
+        for node in nodes:
+            total += node.cookCount() - cook_counts.get(node.sessionId(), 0)
+
+    return total
+
+
+def cookReport() -> str:
+    """Summarize the cooks triggered by every recorded operation.
+
+    Returns:
+        str: One line per operation label
+    """
+    lines = []
+
+    for label, cook_counts in COOK_HISTORY.items():
+        average = sum(cook_counts) / len(cook_counts)
+        lines.append(f"{label} : {len(cook_counts)} runs,"
+                     + f" {average:.1f} cooks per run,"
+                     + f" {max(cook_counts)} max")
+
+    return "\n".join(lines)
@@ -0,0 +1,28 @@
+import importlib.util
+import os
+import sys
+import types
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(REPO_ROOT, "scripts")
+LIGHTTRACKING_DIR = os.path.join(SCRIPTS_DIR, "lighttracking_(UNUSED)")
+
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+# hou only exists inside Houdini, the lighttracking functions under test
+# are pure numpy and only need the import to succeed
+try:
+    import hou
+except ImportError:
+    sys.modules["hou"] = types.ModuleType("hou")
+
+# The lighttracking package is shipped as lighttracking_(UNUSED), its
+# modules import each other under the package name
+if "lighttracking" not in sys.modules:
+    spec = importlib.util.spec_from_file_location(
+        "lighttracking", os.path.join(LIGHTTRACKING_DIR, "__init__.py"),
+        submodule_search_locations=[LIGHTTRACKING_DIR])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules["lighttracking"] = package
+    spec.loader.exec_module(package)
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+import lighttracking.cubemap as cubemap
+import lighttracking.updateuv as updateuv
+
+WIDTH = 128
+HEIGHT = 64
+FACE_SIZE = 48
+
+
+def smoothPlate(channels=None):
+    """A plate that is a smooth function of the direction."""
+    u = (np.arange(WIDTH) + 0.5) / WIDTH
+    v = (np.arange(HEIGHT) + 0.5) / HEIGHT
+    uv = np.stack(np.meshgrid(u, v), axis=-1)
+    directions = updateuv.computeDirections(uv)
+
+    image = (1.0 + 0.5 * directions[..., 0] + 0.25 * directions[..., 1]
+             - 0.3 * directions[..., 2]).astype(np.float32)
+
+    if channels is None:
+        return image
+    return np.stack([image * (channel + 1)
+                     for channel in range(channels)], axis=-1)
+
+
+def test_face_directions_round_trip():
+    rng = np.random.default_rng(0)
+    directions = rng.normal(size=(1000, 3))
+    directions /= np.linalg.norm(directions, axis=-1, keepdims=True)
+
+    faces, st_coordinates = cubemap.directionsToFace(directions)
+
+    assert np.all((st_coordinates >= 0.0) & (st_coordinates <= 1.0))
+    assert np.allclose(
+        cubemap.faceToDirections(faces, st_coordinates), directions,
+        atol=1e-9)
+
+
+@pytest.mark.parametrize("filter", [cubemap.NEAREST, cubemap.BILINEAR])
+def test_constant_plate_round_trip(filter):
+    image = np.full((HEIGHT, WIDTH, 3), 0.7, dtype=np.float32)
+
+    faces = cubemap.equirectToCubemap(image, FACE_SIZE, filter)
+    result = cubemap.cubemapToEquirect(faces, WIDTH, HEIGHT, filter)
+
+    assert faces.shape == (6, FACE_SIZE, FACE_SIZE, 3)
+    assert np.allclose(faces, 0.7, atol=1e-6)
+    assert np.allclose(result, 0.7, atol=1e-6)
+
+
+@pytest.mark.parametrize("channels", [None, 1, 3])
+def test_smooth_plate_round_trip(channels):
+    image = smoothPlate(channels)
+
+    faces = cubemap.equirectToCubemap(image, FACE_SIZE)
+    result = cubemap.cubemapToEquirect(faces, WIDTH, HEIGHT)
+
+    channel_shape = image.shape[2:]
+    assert faces.shape == (6, FACE_SIZE, FACE_SIZE) + channel_shape
+    assert result.shape == image.shape
+
+    scale = np.max(np.abs(image))
+    assert np.max(np.abs(result - image)) / scale < 0.02
+
+
+def test_faces_match_the_plate_directions():
+    image = smoothPlate()
+
+    faces = cubemap.equirectToCubemap(image, FACE_SIZE)
+
+    st = (np.arange(FACE_SIZE) + 0.5) / FACE_SIZE
+    st_coordinates = np.stack(np.meshgrid(st, st), axis=-1)
+    for face in range(6):
+        directions = cubemap.faceToDirections(
+            np.full((FACE_SIZE, FACE_SIZE), face), st_coordinates)
+        expected = (1.0 + 0.5 * directions[..., 0]
+                    + 0.25 * directions[..., 1] - 0.3 * directions[..., 2])
+        assert np.max(np.abs(faces[face] - expected)) < 0.05
+
+
+def test_tables_are_cached():
+    cubemap.clearCache()
+
+    first = cubemap.equirectToCubemapTable(WIDTH, HEIGHT, FACE_SIZE,
+                                           cubemap.BILINEAR)
+    second = cubemap.equirectToCubemapTable(WIDTH, HEIGHT, FACE_SIZE,
+                                            cubemap.BILINEAR)
+
+    assert first is second
+    assert first[0].dtype == np.int32
+
+
+def test_cache_is_bounded_by_bytes(monkeypatch):
+    cubemap.clearCache()
+
+    table = cubemap.equirectToCubemapTable(WIDTH, HEIGHT, FACE_SIZE,
+                                           cubemap.BILINEAR)
+    size = cubemap.tableBytes(table)
+
+    # Room for one table only, the oldest one is released
+    monkeypatch.setattr(cubemap, "TABLE_CACHE_BYTES", size)
+    other = cubemap.cubemapToEquirectTable(WIDTH, HEIGHT, FACE_SIZE,
+                                           cubemap.NEAREST)
+    assert list(cubemap.TABLES.values()) == [other]
+
+    # Tables over the budget are built but never kept
+    monkeypatch.setattr(cubemap, "TABLE_CACHE_BYTES", 0)
+    cubemap.clearCache()
+    first = cubemap.equirectToCubemapTable(WIDTH, HEIGHT, FACE_SIZE)
+    assert not cubemap.TABLES
+    assert cubemap.equirectToCubemapTable(WIDTH, HEIGHT, FACE_SIZE) \
+        is not first
+
+
+def test_chunked_tables_match(monkeypatch):
+    cubemap.clearCache()
+    whole = cubemap.cubemapToEquirectTable(WIDTH, HEIGHT, FACE_SIZE)
+
+    monkeypatch.setattr(cubemap, "TABLE_CHUNK_PIXELS", 100)
+    cubemap.clearCache()
+    chunked = cubemap.cubemapToEquirectTable(WIDTH, HEIGHT, FACE_SIZE)
+
+    np.testing.assert_array_equal(whole[0], chunked[0])
+    np.testing.assert_array_equal(whole[1], chunked[1])
+    assert chunked[1].dtype == np.float32
@@ -0,0 +1,149 @@
+import gzip
+import io
+import os
+import pytest
+from hipindex import hipindex
+from conftest import REPO_ROOT
+
+TEMPLATE_HIP = os.path.join(REPO_ROOT, "template", "HDRI_cop_editor.hip")
+LIGHT_MAKER_HDA = os.path.join(
+    REPO_ROOT, "hda", "cop_illogic.Light_maker_2.1.5.hda")
+LIGHT_EVENT_HDA = os.path.join(
+    REPO_ROOT, "hda", "lop_illogic.light_event.2.0.hda")
+
+
+def test_cpio_entries_of_template_hip():
+    with open(TEMPLATE_HIP, "rb") as stream:
+        names = [name for name, _ in
+                 hipindex.iterCpio(stream, lambda name: True)]
+
+    assert names
+    init_index = names.index("stage/hdri_copnet/Light_maker2.0.init")
+    parm_index = names.index("stage/hdri_copnet/Light_maker2.0.parm")
+    assert init_index < parm_index
+
+
+def test_index_template_hip():
+    record = hipindex.indexFile(TEMPLATE_HIP)
+
+    assert "error" not in record
+    assert record["format"] == "hip"
+
+    light_makers = record["light_makers"]
+    assert len(light_makers) == 1
+
+    light_maker = light_makers[0]
+    assert light_maker["path"] == "stage/hdri_copnet/Light_maker2.0"
+    assert light_maker["type"] == "illogic::Light_maker_2::1.5"
+    assert light_maker["light_mode"] == "proc_PointLight"
+    assert light_maker["filenames"] == {
+        "filename": "R:/lib/hdri_light_v2/0019.exr"}
+    assert light_maker["parms"]["size"] == [1.0, 1.0]
+    assert len(light_maker["parms"]["uv_position"]) == 2
+
+
+def test_indx_sections_of_light_maker_hda():
+    with open(LIGHT_MAKER_HDA, "rb") as stream:
+        start, entries = hipindex.readIndex(stream)
+        names = [entry.name for entry in entries]
+        assert names == ["INDEX_SECTION", "houdini.hdalibrary",
+                         "illogic::Cop/Light_maker_2::1.5"]
+
+        definition = hipindex.readSection(stream, start, entries[2])
+
+    definition_stream = io.BytesIO(definition)
+    start, sections = hipindex.readIndex(definition_stream)
+    sections = {section.name: section for section in sections}
+    assert hipindex.DIALOG_SECTION in sections
+    assert hipindex.CONTENTS_SECTION in sections
+
+    contents = gzip.decompress(hipindex.readSection(
+        definition_stream, start, sections[hipindex.CONTENTS_SECTION]))
+    names = [name for name, _ in hipindex.iterCpio(
+        io.BytesIO(contents), lambda name: True)]
+    assert any(name.startswith(hipindex.ASSET_ROOT) for name in names)
+
+
+def test_index_light_maker_hda():
+    record = hipindex.indexFile(LIGHT_MAKER_HDA)
+
+    assert "error" not in record
+    assert record["format"] == "hda"
+
+    definition, = record["definitions"]
+    assert definition["type"] == "illogic::Cop/Light_maker_2::1.5"
+    assert definition["version"] == "1.5"
+    assert definition["light_mode"] == "proc_PointLight"
+    assert definition["filenames"] == {
+        "filename": "R:/lib/hdri_light_v2/0019.exr"}
+    assert definition["parms"]["uv_position"] == [0.25, 0.5]
+
+
+def test_index_other_hda():
+    record = hipindex.indexFile(LIGHT_EVENT_HDA)
+
+    definition, = record["definitions"]
+    assert definition["type"] == "illogic::Lop/light_event::2.0"
+    assert "light_mode" not in definition
+
+
+@pytest.mark.parametrize("data", [
+    b"INDX",
+    b"not an archive at all",
+])
+def test_broken_hda_is_error_record(tmp_path, data):
+    path = tmp_path / "broken.hda"
+    path.write_bytes(data)
+
+    record = hipindex.indexFile(str(path))
+
+    assert record["file"] == str(path)
+    assert "error" in record
+
+
+def test_corrupt_contents_is_error_record(tmp_path):
+    data = bytearray(open(LIGHT_MAKER_HDA, "rb").read())
+
+    stream = io.BytesIO(bytes(data))
+    start, entries = hipindex.readIndex(stream)
+    definition = hipindex.readSection(stream, start, entries[2])
+    definition_start, sections = hipindex.readIndex(io.BytesIO(definition))
+    contents, = [section for section in sections
+                 if section.name == hipindex.CONTENTS_SECTION]
+
+    # Scramble the deflate stream, keeping the gzip header intact
+    offset = start + entries[2].offset + definition_start + contents.offset
+    assert data[offset:offset + 2] == b"\x1f\x8b"
+    for position in range(offset + 20, offset + contents.size - 20):
+        data[position] ^= 0x55
+
+    path = tmp_path / "corrupt.hda"
+    path.write_bytes(bytes(data))
+
+    record = hipindex.indexFile(str(path))
+
+    assert "error" in record
+
+
+@pytest.mark.parametrize("extension", hipindex.HIP_EXTENSIONS)
+def test_unreadable_hip_is_error_record(tmp_path, extension):
+    path = tmp_path / ("encoded" + extension)
+    path.write_bytes(b"not an archive at all")
+
+    record = hipindex.indexFile(str(path))
+
+    assert "error" in record
+    assert "light_makers" not in record
+
+
+def test_index_show_reports_every_file(tmp_path):
+    (tmp_path / "broken.hda").write_bytes(b"INDX")
+    (tmp_path / "template.hip").write_bytes(
+        open(TEMPLATE_HIP, "rb").read())
+
+    records = {os.path.basename(record["file"]): record
+               for record in hipindex.indexShow(str(tmp_path), jobs=2)}
+
+    assert set(records) == {"broken.hda", "template.hip"}
+    assert "error" in records["broken.hda"]
+    assert len(records["template.hip"]["light_makers"]) == 1
@@ -0,0 +1,136 @@
+import math
+import numpy as np
+import pytest
+import lighttracking.lightindex as lightindex
+import lighttracking.updateuv as updateuv
+
+
+class FakeParm:
+    def __init__(self, value):
+        self.value = value
+
+    def eval(self):
+        return self.value
+
+
+class FakeMappingNode:
+    def __init__(self, **parms):
+        self.parms = {name: FakeParm(value) for name, value in parms.items()}
+
+    def parm(self, name):
+        return self.parms.get(name)
+
+
+def randomLights(count, seed=0):
+    rng = np.random.default_rng(seed)
+    uvs = rng.uniform(0.0, 1.0, (count, 2))
+    radii = rng.uniform(0.02, 0.4, count)
+    return uvs, radii
+
+
+def randomQueries(count, seed=1):
+    rng = np.random.default_rng(seed)
+    queries = rng.uniform(0.0, 1.0, (count, 2))
+    # Queries right on the seam and at the poles
+    queries[:20, 0] = rng.choice([0.0, 0.999999], 20)
+    queries[20:40, 1] = rng.choice([0.0005, 0.9995], 20)
+    return queries
+
+
+def buildIndex(uvs, radii):
+    index = lightindex.LightIndex()
+    for key, (uv, radius) in enumerate(zip(uvs, radii)):
+        index.insert(key, uv, radius)
+    return index
+
+
+def bruteLightsAt(uvs, radii, keys, query):
+    directions = updateuv.computeDirections(uvs[keys])
+    cosines = directions @ updateuv.computeDirections(query)
+    covering = cosines >= np.cos(radii[keys])
+    return [keys[slot] for slot in np.argsort(-cosines)
+            if covering[slot]]
+
+
+def bruteNearest(uvs, keys, query, count):
+    directions = updateuv.computeDirections(uvs[keys])
+    cosines = directions @ updateuv.computeDirections(query)
+    return [keys[slot] for slot in np.argsort(-cosines)[:count]]
+
+
+def test_footprint_radius_of_default_light():
+    mapping_node = FakeMappingNode(sizex=1.0, sizey=1.0, scale2=1.0)
+
+    radius = lightindex.footprintRadius(mapping_node)
+
+    assert radius == pytest.approx(math.atan(0.5 * math.sqrt(2.0)))
+    assert radius == pytest.approx(0.6155, abs=1e-4)
+
+
+def test_footprint_radius_follows_scale():
+    small = FakeMappingNode(sizex=0.3, sizey=0.1, scale2=0.5)
+    large = FakeMappingNode(sizex=0.3, sizey=0.1, scale2=4.0)
+
+    assert lightindex.footprintRadius(small) == pytest.approx(
+        math.atan(0.25 * math.hypot(0.3, 0.1)))
+    assert lightindex.footprintRadius(large) > lightindex.footprintRadius(
+        small)
+
+
+def test_lights_at_matches_brute_force():
+    uvs, radii = randomLights(300)
+    index = buildIndex(uvs, radii)
+    keys = np.arange(300)
+
+    for query in randomQueries(2000):
+        assert index.lightsAt(query) == bruteLightsAt(
+            uvs, radii, keys, query)
+
+
+def test_nearest_matches_brute_force():
+    uvs, radii = randomLights(300)
+    index = buildIndex(uvs, radii)
+    keys = np.arange(300)
+
+    for query in randomQueries(500):
+        found = index.nearest(query, count=5)
+        assert [key for key, _ in found] == bruteNearest(uvs, keys, query, 5)
+
+        angles = [angle for _, angle in found]
+        assert angles == sorted(angles)
+
+
+def test_nearest_with_more_lights_than_indexed():
+    uvs, radii = randomLights(3)
+    index = buildIndex(uvs, radii)
+
+    assert len(index.nearest(np.array([0.5, 0.5]), count=10)) == 3
+    assert lightindex.LightIndex().nearest(np.array([0.5, 0.5])) == []
+
+
+def test_insert_and_remove_keep_the_index_consistent():
+    uvs, radii = randomLights(200, seed=2)
+    index = buildIndex(uvs, radii)
+
+    rng = np.random.default_rng(3)
+    removed = set(rng.choice(200, 80, replace=False).tolist())
+    for key in removed:
+        index.remove(key)
+
+    # Move some of the remaining lights, inserting replaces them
+    moved_uvs = uvs.copy()
+    remaining = sorted(set(range(200)) - removed)
+    for key in remaining[::3]:
+        moved_uvs[key] = rng.uniform(0.0, 1.0, 2)
+        index.insert(key, moved_uvs[key], radii[key])
+
+    assert len(index) == len(remaining)
+    assert all(key in index for key in remaining)
+    assert not any(key in index for key in removed)
+
+    keys = np.array(remaining)
+    for query in randomQueries(1000, seed=4):
+        assert index.lightsAt(query) == bruteLightsAt(
+            moved_uvs, radii, keys, query)
+        assert ([key for key, _ in index.nearest(query, count=3)]
+                == bruteNearest(moved_uvs, keys, query, 3))
@@ -0,0 +1,131 @@
+import math
+import numpy as np
+import pytest
+import lighttracking.lightlod as lightlod
+import lighttracking.updateuv as updateuv
+
+
+def randomLights(count, seed=0, center=(0.3, 0.6), spread=0.02):
+    rng = np.random.default_rng(seed)
+    uvs = np.asarray(center) + rng.normal(0.0, spread, (count, 2))
+    uvs[:, 0] %= 1.0
+    powers = rng.uniform(0.5, 4.0, count)
+    sizes = rng.uniform(0.05, 0.3, (count, 2))
+    scales = rng.uniform(0.5, 2.0, count)
+    return uvs, powers, lightlod.planeSizes(sizes, scales)
+
+
+def test_plane_sizes_follow_scale():
+    plane_sizes = lightlod.planeSizes(
+        np.array([[1.0, 0.5], [0.2, -0.4]]), np.array([2.0, 0.5]))
+
+    assert np.allclose(plane_sizes, [[2.0, 1.0], [0.1, 0.2]])
+
+
+def test_solid_angle_of_small_and_large_rectangles():
+    small = lightlod.solidAngles(np.array([1e-3, 2e-3]))
+    assert small == pytest.approx(2e-6, rel=1e-5)
+
+    # An infinite plane covers a hemisphere
+    large = lightlod.solidAngles(np.array([1e6, 1e6]))
+    assert large == pytest.approx(2.0 * math.pi, rel=1e-5)
+
+
+def test_cluster_lights_respects_max_angle():
+    rng = np.random.default_rng(1)
+    directions = rng.normal(size=(300, 3))
+    directions /= np.linalg.norm(directions, axis=-1, keepdims=True)
+    powers = rng.uniform(0.0, 5.0, 300)
+    max_angle = math.radians(20.0)
+
+    clusters = lightlod.clusterLights(directions, powers, max_angle)
+
+    members = np.concatenate(clusters)
+    assert np.array_equal(np.sort(members), np.arange(300))
+
+    for cluster in clusters:
+        # The seed is the brightest light of its cluster
+        assert powers[cluster[0]] == np.max(powers[cluster])
+        cosines = directions[cluster] @ directions[cluster[0]]
+        assert np.all(cosines >= math.cos(max_angle) - 1e-12)
+
+    # Seeds are further apart than max_angle
+    seeds = directions[[cluster[0] for cluster in clusters]]
+    cosines = seeds @ seeds.T
+    np.fill_diagonal(cosines, -1.0)
+    assert np.all(cosines < math.cos(max_angle))
+
+
+def test_single_light_is_its_own_equivalent():
+    uvs = np.array([[0.3, 0.6]])
+    plane_sizes = np.array([[0.4, 0.2]])
+
+    uv, power, plane_size = lightlod.equivalentLight(
+        uvs, np.array([2.0]), plane_sizes)
+
+    assert np.allclose(uv, uvs[0])
+    assert power == pytest.approx(2.0)
+    assert np.allclose(plane_size, plane_sizes[0])
+
+
+def test_rotated_light_swaps_its_axes():
+    _, _, plane_size = lightlod.equivalentLight(
+        np.array([[0.3, 0.6]]), np.array([1.0]), np.array([[0.4, 0.2]]),
+        np.array([90.0]))
+
+    assert np.allclose(plane_size, [0.2, 0.4])
+
+
+@pytest.mark.parametrize("center", [(0.3, 0.6), (0.001, 0.4), (0.7, 0.98)],
+                         ids=["middle", "seam", "pole"])
+def test_equivalent_light_conserves_energy(center):
+    uvs, powers, plane_sizes = randomLights(8, center=center)
+
+    uv, power, plane_size = lightlod.equivalentLight(
+        uvs, powers, plane_sizes)
+
+    assert power * lightlod.lightAreas(plane_size) == pytest.approx(
+        powers @ lightlod.lightAreas(plane_sizes), rel=1e-12)
+
+    # Its center stays among the members
+    direction = updateuv.computeDirections(uv)
+    directions = updateuv.computeDirections(uvs)
+    spread = np.max(np.arccos(np.clip(directions @ directions.T, -1, 1)))
+    assert np.max(np.arccos(np.clip(directions @ direction, -1, 1))) <= spread
+
+
+def test_equivalent_light_spans_separated_members():
+    # Two small lights on both sides of the centroid along the longitude
+    uvs = np.array([[0.49, 0.5], [0.51, 0.5]])
+    plane_sizes = np.full((2, 2), 1e-3)
+
+    uv, _, plane_size = lightlod.equivalentLight(
+        uvs, np.ones(2), plane_sizes)
+
+    offset = math.tan(0.01 * 2.0 * math.pi)
+    assert np.allclose(uv, [0.5, 0.5])
+    assert plane_size[0] == pytest.approx(
+        math.sqrt(12.0) * offset, rel=1e-3)
+    assert plane_size[1] == pytest.approx(1e-3, rel=1e-3)
+
+
+def test_preview_error_is_small_for_tight_clusters():
+    uvs, powers, plane_sizes = randomLights(16, spread=0.005)
+    directions = updateuv.computeDirections(uvs)
+
+    uv, power, plane_size = lightlod.equivalentLight(
+        uvs, powers, plane_sizes)
+
+    rms_error, max_error = lightlod.previewError(
+        directions, powers, plane_sizes,
+        updateuv.computeDirections(uv[np.newaxis]), np.array([power]),
+        plane_size[np.newaxis])
+
+    naive_rms_error, _ = lightlod.previewError(
+        directions, powers, plane_sizes,
+        updateuv.computeDirections(uv[np.newaxis]),
+        np.array([np.sum(powers)]), plane_size[np.newaxis])
+
+    assert rms_error < 0.05
+    assert max_error < 0.1
+    assert rms_error < naive_rms_error
@@ -0,0 +1,143 @@
+import math
+import numpy as np
+import pytest
+import lighttracking.shprojection as shprojection
+import lighttracking.updateuv as updateuv
+
+WIDTH = 128
+HEIGHT = 64
+
+
+def plate(seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0.0, 1.0, (HEIGHT, WIDTH, 3))
+
+
+def pixelDirections(projector):
+    u, v = np.meshgrid(projector.u, projector.v)
+    return updateuv.computeDirections(np.stack([u, v], axis=-1))
+
+
+def addLight(image, projector, uv_coordinates, radius, color):
+    """Add a constant light covering every pixel center of a cap."""
+    center = updateuv.computeDirections(np.asarray(uv_coordinates))
+    cosines = pixelDirections(projector) @ center
+    edited = image.copy()
+    edited[cosines >= math.cos(radius)] += color
+    return edited
+
+
+def test_project_constant_image():
+    projector = shprojection.SHProjector(WIDTH, HEIGHT)
+    image = np.ones((HEIGHT, WIDTH, 1))
+
+    coefficients = projector.project(image)
+
+    # Only the constant band is left, with the full sphere solid angle,
+    # band 2 being off by the pixel center quadrature
+    assert coefficients[0, 0] == pytest.approx(
+        4.0 * math.pi * 0.282095, rel=1e-5)
+    assert np.allclose(coefficients[1:4], 0.0, atol=1e-10)
+    assert np.allclose(coefficients[4:], 0.0, atol=1e-3)
+
+
+def test_tiling_does_not_change_the_projection():
+    image = plate()
+
+    tiled = shprojection.SHProjector(WIDTH, HEIGHT, tile_rows=5)
+    untiled = shprojection.SHProjector(WIDTH, HEIGHT, tile_rows=HEIGHT)
+
+    assert np.allclose(tiled.project(image), untiled.project(image),
+                       rtol=0, atol=1e-10)
+
+
+@pytest.mark.parametrize("uv_coordinates, radius", [
+    ((0.4, 0.5), 0.2),
+    # Wraps around u = 0
+    ((0.01, 0.45), 0.25),
+    ((0.995, 0.6), 0.3),
+    # Reaches a pole
+    ((0.3, 0.97), 0.2),
+    ((0.7, 0.02), 0.15),
+], ids=["center", "seam_left", "seam_right", "north_pole", "south_pole"])
+def test_update_region_matches_full_projection(uv_coordinates, radius):
+    projector = shprojection.SHProjector(WIDTH, HEIGHT, tile_rows=7)
+    before = plate()
+    after = addLight(before, projector, uv_coordinates, radius,
+                     [5.0, 3.0, 1.0])
+    assert not np.array_equal(before, after)
+
+    coefficients = projector.project(before)
+    updated = projector.updateRegion(
+        coefficients, before, after, np.asarray(uv_coordinates), radius)
+
+    assert np.allclose(updated, projector.project(after),
+                       rtol=0, atol=1e-10)
+
+
+def test_footprint_covers_the_cap():
+    projector = shprojection.SHProjector(WIDTH, HEIGHT)
+
+    for uv_coordinates, radius in [((0.01, 0.45), 0.25),
+                                   ((0.3, 0.97), 0.2)]:
+        before = np.zeros((HEIGHT, WIDTH, 1))
+        after = addLight(before, projector, uv_coordinates, radius, [1.0])
+
+        rows, cols_list = projector.footprint(
+            np.asarray(uv_coordinates), radius)
+        covered = np.zeros((HEIGHT, WIDTH), dtype=bool)
+        for cols in cols_list:
+            covered[rows, cols] = True
+
+        assert np.all(covered[after[..., 0] > 0])
+
+
+def test_footprint_splits_at_the_seam():
+    projector = shprojection.SHProjector(WIDTH, HEIGHT)
+
+    _, cols_list = projector.footprint(np.array([0.01, 0.5]), 0.2)
+
+    assert len(cols_list) == 2
+
+
+def test_footprint_spans_every_column_at_a_pole():
+    projector = shprojection.SHProjector(WIDTH, HEIGHT)
+
+    _, cols_list = projector.footprint(np.array([0.3, 0.97]), 0.2)
+
+    assert len(cols_list) == 1
+    assert cols_list[0].start == 0
+    assert cols_list[0].stop == WIDTH
+
+
+def test_irradiance_preview_follows_the_light():
+    source = plate()
+    projector = shprojection.SHProjector(WIDTH, HEIGHT)
+    uv_coordinates = np.array([0.01, 0.95])
+    edited = addLight(source, projector, uv_coordinates, 0.3, [2.0, 2.0, 2.0])
+
+    preview = shprojection.IrradiancePreview(source)
+    preview.updateLight(edited, uv_coordinates, 0.3)
+
+    full = shprojection.IrradiancePreview(source, edited)
+
+    assert np.allclose(preview.preview(32)[1], full.preview(32)[1],
+                       rtol=0, atol=1e-8)
+
+
+def test_irradiance_preview_follows_in_place_edits():
+    image = plate()
+    projector = shprojection.SHProjector(WIDTH, HEIGHT)
+    uv_coordinates = np.array([0.6, 0.4])
+
+    preview = shprojection.IrradiancePreview(image)
+
+    # The caller edits the same array it gave to the preview
+    image[...] = addLight(image, projector, uv_coordinates, 0.3,
+                          [2.0, 2.0, 2.0])
+    preview.updateLight(image, uv_coordinates, 0.3)
+
+    full = shprojection.IrradiancePreview(image.copy(), image)
+
+    assert np.allclose(preview.preview(32)[1], full.preview(32)[1],
+                       rtol=0, atol=1e-8)